@@ -1,36 +1,253 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
 import requests
-from .config import COC_API_TOKEN, BASE_URL
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from . import response_cache
+from . import singleflight
+from . import rate_limiter
+from . import conditional
+from . import token_pool
+from . import resilience
+from . import negative_cache
+from . import upstream
+from .config import (
+    BASE_URL,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_POOL_BLOCK,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HEDGE_MAX_WORKERS,
+)
 
-HEADERS = {
-    "Authorization": f"Bearer {COC_API_TOKEN}"
+# =============================
+# 📊 Contadores de conexiones
+# =============================
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "new_connections": 0,
 }
 
+def _count(key: str):
+    with _stats_lock:
+        _stats[key] += 1
+
+def connection_summary(total: int, new: int) -> dict:
+    reused = max(0, total - new)
+
+    return {
+        "requests": total,
+        "new_connections": new,
+        "reused_connections": reused,
+        "reuse_ratio": round(reused / total, 3) if total else 0.0,
+    }
+
+def get_connection_stats():
+    """Solo la sesión requests (rutas síncronas y live_cwl.py); el resto va por httpx."""
+    with _stats_lock:
+        return connection_summary(_stats["requests"], _stats["new_connections"])
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count("new_connections")
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count("new_connections")
+        return super()._new_conn()
+
+
+class _PooledAdapter(HTTPAdapter):
+    """
+    HTTPAdapter cuyo pool cuenta las conexiones TCP+TLS nuevas.
+    Todo lo que no sea conexión nueva es una conexión keep-alive reutilizada.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+# =============================
+# 🔌 Sesión HTTP compartida
+# =============================
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                adapter = _PooledAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                    pool_block=HTTP_POOL_BLOCK,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+
+    return _session
+
+def close_session():
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+# Hilos para las peticiones "hedged" (la original y su respaldo)
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="coc-hedge")
+
+def _get(url: str, headers=None) -> requests.Response:
+    _count("requests")
+    return get_session().get(
+        url,
+        headers=headers,
+        timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+    )
+
+
+def _raise_remembered(url: str, status: int):
+    # 🚫 Mismo error que daría la API, sin llamarla
+    r = requests.Response()
+    r.status_code = status
+    r.url = url
+    r.reason = "cached"
+    r.raise_for_status()
+
+def _get_json(url: str, priority: int = rate_limiter.PRIORITY_NORMAL):
+    remembered = negative_cache.get(url)
+    if remembered is not None:
+        _raise_remembered(url, remembered)
+
+    cached = response_cache.get(url)
+    if cached is not None:
+        return cached
+
+    # 🛫 Llamadas concurrentes a la misma URL comparten una sola petición
+    return singleflight.do(url, lambda: _fetch_json(url, priority))
+
+def _send(url: str, headers: dict):
+    # Una petición, con el token menos cargado del pool
+    token = token_pool.acquire()
+    start = time.monotonic()
+
+    try:
+        r = _get(url, {**headers, **token_pool.auth_headers(token)})
+    except Exception:
+        token_pool.release(token)
+        raise
+
+    upstream.sent(url, token, start, r)
+    return r
+
+def _send_hedged(url: str, headers: dict):
+    delay = resilience.hedge_delay(resilience.endpoint_kind(url))
+    if delay is None:
+        return _send(url, headers)
+
+    first = _hedge_pool.submit(_send, url, headers)
+    try:
+        return first.result(timeout=delay)
+    except FutureTimeout:
+        pass
+
+    # 🐇 Tarda más que su p95: petición de respaldo, solo si hay token libre ya
+    if not rate_limiter.try_acquire():
+        return first.result()
+
+    resilience.count("hedges")
+    second = _hedge_pool.submit(_send, url, headers)
+    pending = {first, second}
+    error = None
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    resilience.count("hedges_won")
+                return future.result()
+            error = future.exception()
+
+    raise error
+
+def _request(url: str, priority: int, headers: dict):
+    attempts = upstream.Attempts()
+
+    while True:
+        rate_limiter.acquire(priority)
+
+        try:
+            r = _send_hedged(url, headers)
+        except (requests.ConnectionError, requests.Timeout):
+            delay = attempts.retry_delay()
+            if delay is None:
+                raise
+            time.sleep(delay)
+            continue
+
+        delay = attempts.retry_delay(r)
+        if delay is None:
+            return r
+        if delay:
+            time.sleep(delay)
+
+def _fetch_json(url: str, priority: int):
+    if not resilience.allow_request():
+        return upstream.stale_or_circuit_open(url)
+
+    try:
+        r = _request(url, priority, conditional.request_headers(url))
+    except (requests.ConnectionError, requests.Timeout):
+        stale = upstream.serve_stale(url)
+        if stale is None:
+            raise
+        return stale
+
+    stored = upstream.not_modified(url, r)
+    if stored is None and r.status_code == 304:
+        r = _request(url, priority, {})
+
+    return upstream.finish(url, r, stored)
+
+
 def encode(tag: str) -> str:
     return requests.utils.quote(tag)
 
+def league_group_url(clan_tag: str) -> str:
+    return f"{BASE_URL}/clans/{encode(clan_tag)}/currentwar/leaguegroup"
+
 def get_league_group_api(clan_tag: str):
-    url = f"{BASE_URL}/clans/{encode(clan_tag)}/currentwar/leaguegroup"
-    r = requests.get(url, headers=HEADERS)
-    r.raise_for_status()
-    return r.json()
+    return _get_json(league_group_url(clan_tag))
 
-def get_war_api(war_tag: str):
+def get_war_api(war_tag: str, priority: int = rate_limiter.PRIORITY_NORMAL):
     url = f"{BASE_URL}/clanwarleagues/wars/{encode(war_tag)}"
-    r = requests.get(url, headers=HEADERS)
-    r.raise_for_status()
-    return r.json()
+    return _get_json(url, priority)
 
 def get_clan_info_api(clan_tag: str):
     clan_tag = clan_tag.replace("#", "%23")
     url = f"{BASE_URL}/clans/{clan_tag}"
-    r = requests.get(url, headers=HEADERS)
-    if r.status_code != 200:
+    try:
+        return _get_json(url, rate_limiter.PRIORITY_SCOUTING)
+    except requests.HTTPError:
         return {"error": "Clan no encontrado o privado"}
-    data = r.json()
-    return data
 
 def get_normal_summary_api(clan_tag: str):
     url = f"{BASE_URL}/clans/{encode(clan_tag)}/currentwar"
-    r = requests.get(url, headers=HEADERS)
-    r.raise_for_status()
-    return r.json()
\ No newline at end of file
+    return _get_json(url, rate_limiter.PRIORITY_LIVE)
@@ -0,0 +1,192 @@
+import asyncio
+import time
+import httpx
+from . import response_cache
+from . import singleflight
+from . import rate_limiter
+from . import conditional
+from . import token_pool
+from . import resilience
+from . import negative_cache
+from . import upstream
+from .api_client import encode, league_group_url, connection_summary
+from .config import (
+    BASE_URL,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    ASYNC_HTTP_MAX_CONNECTIONS,
+    ASYNC_HTTP_MAX_KEEPALIVE,
+)
+
+# =============================
+# ⚡ Cliente httpx compartido (uno por proceso / event loop)
+# =============================
+_client = None
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+
+    if _client is None:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_HTTP_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+
+    return _client
+
+async def close_client():
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+# =============================
+# 📊 Contadores de conexiones (un solo event loop: sin lock)
+# =============================
+_stats = {
+    "requests": 0,
+    "new_connections": 0,
+}
+
+async def _trace(event_name: str, info: dict):
+    # httpcore avisa de cada conexión TCP nueva; el resto reutiliza una keep-alive
+    if event_name == "connection.connect_tcp.complete":
+        _stats["new_connections"] += 1
+
+def get_async_connection_stats():
+    return connection_summary(_stats["requests"], _stats["new_connections"])
+
+async def _get(url: str, headers=None) -> httpx.Response:
+    _stats["requests"] += 1
+    return await get_client().get(url, headers=headers, extensions={"trace": _trace})
+
+def _raise_remembered(url: str, status: int):
+    # 🚫 Mismo error que daría la API, sin llamarla
+    httpx.Response(status, request=httpx.Request("GET", url)).raise_for_status()
+
+async def _get_json(url: str, priority: int = rate_limiter.PRIORITY_NORMAL):
+    remembered = negative_cache.get(url)
+    if remembered is not None:
+        _raise_remembered(url, remembered)
+
+    cached = response_cache.get(url)
+    if cached is not None:
+        return cached
+
+    # 🛫 Llamadas concurrentes a la misma URL comparten una sola petición
+    return await singleflight.do_async(url, lambda: _fetch_json(url, priority))
+
+async def _send(url: str, headers: dict):
+    # Una petición, con el token menos cargado del pool
+    token = token_pool.acquire()
+    start = time.monotonic()
+
+    try:
+        r = await _get(url, {**headers, **token_pool.auth_headers(token)})
+    except BaseException:
+        token_pool.release(token)
+        raise
+
+    upstream.sent(url, token, start, r)
+    return r
+
+async def _send_hedged(url: str, headers: dict):
+    delay = resilience.hedge_delay(resilience.endpoint_kind(url))
+    if delay is None:
+        return await _send(url, headers)
+
+    first = asyncio.ensure_future(_send(url, headers))
+    tasks = [first]
+
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return first.result()
+
+        # 🐇 Tarda más que su p95: petición de respaldo, solo si hay token libre ya
+        if not rate_limiter.try_acquire():
+            return await first
+
+        resilience.count("hedges")
+        second = asyncio.ensure_future(_send(url, headers))
+        tasks.append(second)
+        pending = set(tasks)
+        error = None
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        resilience.count("hedges_won")
+                    return task.result()
+                error = task.exception()
+
+        raise error
+    finally:
+        # La que pierde (o todas, si nos cancelan) se cancela
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+async def _request(url: str, priority: int, headers: dict):
+    attempts = upstream.Attempts()
+
+    while True:
+        await rate_limiter.acquire_async(priority)
+
+        try:
+            r = await _send_hedged(url, headers)
+        except httpx.TransportError:
+            delay = attempts.retry_delay()
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+
+        delay = attempts.retry_delay(r)
+        if delay is None:
+            return r
+        if delay:
+            await asyncio.sleep(delay)
+
+async def _fetch_json(url: str, priority: int):
+    if not resilience.allow_request():
+        return upstream.stale_or_circuit_open(url)
+
+    try:
+        r = await _request(url, priority, conditional.request_headers(url))
+    except httpx.TransportError:
+        stale = upstream.serve_stale(url)
+        if stale is None:
+            raise
+        return stale
+
+    stored = upstream.not_modified(url, r)
+    if stored is None and r.status_code == 304:
+        r = await _request(url, priority, {})
+
+    return upstream.finish(url, r, stored)
+
+
+async def get_league_group_api(clan_tag: str):
+    return await _get_json(league_group_url(clan_tag))
+
+async def get_war_api(war_tag: str, priority: int = rate_limiter.PRIORITY_NORMAL):
+    url = f"{BASE_URL}/clanwarleagues/wars/{encode(war_tag)}"
+    return await _get_json(url, priority)
+
+async def get_clan_info_api(clan_tag: str):
+    url = f"{BASE_URL}/clans/{encode(clan_tag)}"
+    try:
+        return await _get_json(url, rate_limiter.PRIORITY_SCOUTING)
+    except httpx.HTTPStatusError:
+        return {"error": "Clan no encontrado o privado"}
+
+async def get_normal_summary_api(clan_tag: str):
+    url = f"{BASE_URL}/clans/{encode(clan_tag)}/currentwar"
+    return await _get_json(url, rate_limiter.PRIORITY_LIVE)
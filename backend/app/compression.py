@@ -0,0 +1,225 @@
+import gzip
+import os
+import zlib
+from mimetypes import guess_type
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles
+from .config import (
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_BROTLI_QUALITY,
+    STATIC_MAX_AGE,
+)
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él, solo gzip
+    brotli = None
+
+# =============================
+# 🗜️ Compresión de respuestas (gzip / brotli)
+# =============================
+# Se negocia con Accept-Encoding (br si está instalado, si no gzip). Las respuestas
+# completas se comprimen de una vez si superan COMPRESSION_MIN_SIZE; las que llegan
+# por trozos (streaming) se comprimen trozo a trozo con flush, para no retrasarlas.
+# Solo tipos de texto: las imágenes ya vienen comprimidas.
+
+_COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/vnd.apache.arrow.stream",
+    "image/svg+xml",
+    "text/",
+)
+_COMPRESSIBLE_EXTENSIONS = (".json", ".js", ".css", ".html", ".svg", ".txt", ".map")
+
+def _encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def choose_encoding(accept_encoding: str):
+    """Mejor codificación aceptada por el cliente ("br" / "gzip") o None."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+
+    best = None
+    for encoding in _encodings():
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (encoding, q)
+
+    return best[0] if best else None
+
+def _is_compressible(content_type: str) -> bool:
+    # SSE: cada evento tiene que llegar en cuanto se emite
+    if content_type.startswith("text/event-stream"):
+        return False
+    return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+class _Compressor:
+    def __init__(self, encoding):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = formato gzip
+
+    def chunk(self, data: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _CompressingSend(send, encoding))
+
+
+class _CompressingSend:
+    def __init__(self, send, encoding):
+        self.send = send
+        self.encoding = encoding
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    def _set_headers(self, streaming, length=None):
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if streaming:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(length)
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = Headers(raw=self.start["headers"])
+
+            if (
+                "content-encoding" in headers
+                or not _is_compressible(headers.get("content-type", ""))
+                or (not more_body and len(body) < COMPRESSION_MIN_SIZE)
+            ):
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding)
+
+            if not more_body:
+                # Respuesta completa: de una vez
+                body = self.compressor.finish(body)
+                self._set_headers(streaming=False, length=len(body))
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+
+            self._set_headers(streaming=True)
+            await self.send(self.start)
+
+        body = self.compressor.chunk(body) if more_body else self.compressor.finish(body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+
+# =============================
+# 🖼️ Estáticos precomprimidos con caché larga
+# =============================
+def precompress_static(directory: str):
+    """Genera fichero.gz (y fichero.br con brotli) junto a cada estático comprimible."""
+    written = 0
+
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(_COMPRESSIBLE_EXTENSIONS):
+                continue
+
+            path = os.path.join(root, name)
+            if os.path.getsize(path) < COMPRESSION_MIN_SIZE:
+                continue
+
+            with open(path, "rb") as f:
+                data = None
+                for suffix, compress in (
+                    (".gz", lambda raw: gzip.compress(raw, compresslevel=9, mtime=0)),
+                    (".br", (lambda raw: brotli.compress(raw, quality=11)) if brotli else None),
+                ):
+                    target = path + suffix
+                    if compress is None:
+                        continue
+                    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                        continue
+                    if data is None:
+                        data = f.read()
+                    with open(target, "wb") as out:
+                        out.write(compress(data))
+                    written += 1
+
+    if written:
+        print(f"🗜️ {written} estáticos precomprimidos en {directory}")
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles que sirve fichero.br / fichero.gz si existen, con caché inmutable."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        headers = Headers(scope=scope)
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+        variant = f"{full_path}.{'gz' if encoding == 'gzip' else encoding}" if encoding else None
+
+        if variant and os.path.isfile(variant):
+            response = super().file_response(variant, os.stat(variant), scope, status_code)
+            if isinstance(response, FileResponse):
+                # El tipo es el del original, no el del .gz / .br
+                response.headers["Content-Type"] = guess_type(str(full_path))[0] or "text/plain"
+                response.headers["Content-Encoding"] = encoding
+            response.headers.add_vary_header("Accept-Encoding")
+        else:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+
+        response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+        return response
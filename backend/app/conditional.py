@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+from .config import CONDITIONAL_MAX_ENTRIES
+
+# =============================
+# 🏷️ Peticiones condicionales (ETag / Last-Modified)
+# =============================
+# Por cada URL se guardan los validadores de la última respuesta 200 junto al JSON
+# ya parseado. La siguiente petición lleva If-None-Match / If-Modified-Since y, si
+# la API contesta 304, se devuelve el cuerpo guardado sin volver a parsear nada.
+
+_entries = OrderedDict()  # url → {"etag", "last_modified", "data", "size"}
+_lock = threading.Lock()
+_stats = {
+    "conditional_requests": 0,
+    "not_modified": 0,
+    "changed": 0,
+}
+
+def request_headers(url: str) -> dict:
+    with _lock:
+        entry = _entries.get(url)
+
+        if entry is None:
+            return {}
+
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        if headers:
+            _stats["conditional_requests"] += 1
+        return headers
+
+def remember(url: str, response_headers, data, size: int):
+    etag = response_headers.get("ETag")
+    last_modified = response_headers.get("Last-Modified")
+
+    with _lock:
+        previous = _entries.pop(url, None)
+
+        # 🛑 Sin validadores no hay nada que revalidar
+        if not etag and not last_modified:
+            return
+
+        if previous is not None and (previous["etag"], previous["last_modified"]) != (etag, last_modified):
+            _stats["changed"] += 1
+
+        _entries[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "data": data,
+            "size": size,
+        }
+
+        while len(_entries) > CONDITIONAL_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+def not_modified(url: str):
+    """Respuesta 304: devuelve (data, size) guardados, o None si ya no los tenemos."""
+    with _lock:
+        entry = _entries.get(url)
+
+        if entry is None:
+            return None
+
+        _entries.move_to_end(url)
+        _stats["not_modified"] += 1
+        return entry["data"], entry["size"]
+
+def get_conditional_stats():
+    with _lock:
+        return {
+            "entries": len(_entries),
+            **_stats,
+        }
@@ -4,7 +4,204 @@ from dotenv import load_dotenv
 load_dotenv()
 
 COC_API_TOKEN = os.getenv("COC_API_TOKEN")
+# Varios tokens separados por comas (más ritmo total); si no hay, solo COC_API_TOKEN
+COC_API_TOKENS = [
+    token.strip() for token in os.getenv("COC_API_TOKENS", "").split(",") if token.strip()
+] or ([COC_API_TOKEN] if COC_API_TOKEN else [])
 BASE_URL = "https://api.clashofclans.com/v1"
 
-if not COC_API_TOKEN:
+if not COC_API_TOKENS:
     raise RuntimeError("COC_API_TOKEN no está definido")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# =============================
+# 🔌 Cliente HTTP síncrono (requests: rutas síncronas y live_cwl.py)
+# =============================
+# Nº de pools por host que se mantienen abiertos
+HTTP_POOL_CONNECTIONS = int(os.getenv("COC_HTTP_POOL_CONNECTIONS", "4"))
+# Conexiones keep-alive máximas por host
+HTTP_POOL_MAXSIZE = int(os.getenv("COC_HTTP_POOL_MAXSIZE", "32"))
+# Si el pool está lleno, esperar a que se libere una conexión en vez de abrir otra
+HTTP_POOL_BLOCK = _env_bool("COC_HTTP_POOL_BLOCK", True)
+# Timeouts por defecto (segundos)
+HTTP_CONNECT_TIMEOUT = float(os.getenv("COC_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("COC_HTTP_READ_TIMEOUT", "15"))
+
+# =============================
+# ⚡ Cliente HTTP asíncrono (httpx)
+# =============================
+# Conexiones simultáneas máximas hacia la API desde un mismo worker
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("COC_ASYNC_HTTP_MAX_CONNECTIONS", "200"))
+ASYNC_HTTP_MAX_KEEPALIVE = int(os.getenv("COC_ASYNC_HTTP_MAX_KEEPALIVE", "50"))
+
+# =============================
+# 🏆 CWL
+# =============================
+# Peticiones simultáneas de warTags al montar el resumen de una CWL
+CWL_WAR_FETCH_CONCURRENCY = int(os.getenv("CWL_WAR_FETCH_CONCURRENCY", "8"))
+# Probabilidad de victoria de una guerra inWar: "exact" (convolución) o "montecarlo"
+WIN_PROB_METHOD = os.getenv("WIN_PROB_METHOD", "exact").strip().lower()
+if WIN_PROB_METHOD not in ("exact", "montecarlo"):
+    raise RuntimeError(f"WIN_PROB_METHOD debe ser 'exact' o 'montecarlo', no '{WIN_PROB_METHOD}'")
+# Simulaciones si WIN_PROB_METHOD=montecarlo
+WIN_PROB_SIMULATIONS = int(os.getenv("WIN_PROB_SIMULATIONS", "10000"))
+# Simulaciones de la probabilidad de victoria en guerra normal (/war/normal-probabilities)
+NORMAL_WAR_SIMULATIONS = int(os.getenv("NORMAL_WAR_SIMULATIONS", "4000"))
+# Resultados memoizados por estado de la guerra (estrellas, ataques, distribuciones...)
+WIN_PROB_CACHE_SIZE = int(os.getenv("WIN_PROB_CACHE_SIZE", "4096"))
+# Entradas máximas del índice warTag → clanes (una temporada completa son miles, no millones)
+WAR_INDEX_MAX_ENTRIES = int(os.getenv("WAR_INDEX_MAX_ENTRIES", "20000"))
+# Almacén en disco (SQLite) de guerras finalizadas y sus resúmenes ya calculados
+WAR_STORE_ENABLED = _env_bool("WAR_STORE_ENABLED", True)
+WAR_STORE_PATH = os.getenv("WAR_STORE_PATH", "data/war_store.sqlite3")
+
+# =============================
+# 🧠 Caché de respuestas de la API
+# =============================
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# TTL (segundos) según el estado de la guerra si el upstream no manda Cache-Control
+CACHE_TTL_IN_WAR = float(os.getenv("CACHE_TTL_IN_WAR", "30"))
+CACHE_TTL_PREPARATION = float(os.getenv("CACHE_TTL_PREPARATION", "600"))
+CACHE_TTL_WAR_ENDED = float(os.getenv("CACHE_TTL_WAR_ENDED", "3600"))
+CACHE_TTL_DEFAULT = float(os.getenv("CACHE_TTL_DEFAULT", "60"))
+
+# =============================
+# 🚦 Límite de peticiones hacia la API
+# =============================
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "10"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+# Ritmo y ráfaga son por token: el total se multiplica por los tokens sanos
+# Ritmo mínimo al que se baja tras recibir 429
+RATE_LIMIT_MIN_PER_SECOND = float(os.getenv("RATE_LIMIT_MIN_PER_SECOND", "1"))
+# Pausa (segundos) tras un 429 sin cabecera Retry-After
+RATE_LIMIT_DEFAULT_BACKOFF = float(os.getenv("RATE_LIMIT_DEFAULT_BACKOFF", "1"))
+# Reintentos de una misma petición tras un 429
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "2"))
+
+# =============================
+# 🏷️ Peticiones condicionales (ETag / Last-Modified)
+# =============================
+# URLs cuyos validadores y último cuerpo se recuerdan
+CONDITIONAL_MAX_ENTRIES = int(os.getenv("CONDITIONAL_MAX_ENTRIES", "2000"))
+
+# =============================
+# 🔑 Pool de tokens
+# =============================
+# Cuarentena (segundos) de un token rechazado por IP inválida (403)
+TOKEN_QUARANTINE_FORBIDDEN = float(os.getenv("TOKEN_QUARANTINE_FORBIDDEN", "3600"))
+# Cuarentena (segundos) de un token con TOKEN_MAX_429 respuestas 429 en TOKEN_429_WINDOW segundos
+TOKEN_QUARANTINE_THROTTLED = float(os.getenv("TOKEN_QUARANTINE_THROTTLED", "60"))
+TOKEN_MAX_429 = int(os.getenv("TOKEN_MAX_429", "3"))
+TOKEN_429_WINDOW = float(os.getenv("TOKEN_429_WINDOW", "30"))
+
+# =============================
+# 🛡️ Latencia de cola: reintentos, hedging y circuit breaker
+# =============================
+# Tiempo total máximo (segundos) de una llamada, reintentos incluidos
+HTTP_CALL_DEADLINE = float(os.getenv("COC_HTTP_CALL_DEADLINE", "30"))
+# Reintentos con jitter ante errores de red / timeouts / 5xx
+HTTP_RETRY_MAX = int(os.getenv("COC_HTTP_RETRY_MAX", "2"))
+HTTP_RETRY_BASE_DELAY = float(os.getenv("COC_HTTP_RETRY_BASE_DELAY", "0.2"))
+HTTP_RETRY_MAX_DELAY = float(os.getenv("COC_HTTP_RETRY_MAX_DELAY", "2"))
+# Petición de respaldo cuando una llamada supera el p95 de su endpoint
+HEDGE_ENABLED = _env_bool("COC_HEDGE_ENABLED", True)
+HEDGE_MIN_SAMPLES = int(os.getenv("COC_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("COC_HEDGE_MIN_DELAY", "0.1"))
+HEDGE_MAX_WORKERS = int(os.getenv("COC_HEDGE_MAX_WORKERS", "64"))
+# Fallos seguidos que abren el circuito y segundos hasta volver a probar
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("COC_BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("COC_BREAKER_COOLDOWN", "30"))
+
+# =============================
+# ⏱️ Precarga en segundo plano (clanes vigilados)
+# =============================
+# Clanes cuyo resumen CWL se mantiene caliente en memoria (tags separados por comas)
+_DEFAULT_WATCHLIST = (
+    "#2R9JPR82Y,#2L8V8CPLV,#2CP9C2VJ0,#2RUQCC9RP,#2JL989J2C,#2GCVLQPVQ,#2R9J9Q029,"
+    "#P0CJRRQ,#28U2CV0PV,#8L8PPVYU8,#2CPU9J20Q,#2CGYYGP8C,#2JJRCGJC2"
+)
+WATCHLIST_CLAN_TAGS = [
+    tag.strip().upper() for tag in os.getenv("WATCHLIST_CLAN_TAGS", _DEFAULT_WATCHLIST).split(",") if tag.strip()
+]
+SCHEDULER_ENABLED = _env_bool("SCHEDULER_ENABLED", True)
+# Cada cuánto (segundos) mira el planificador qué clanes toca refrescar
+SCHEDULER_TICK = float(os.getenv("SCHEDULER_TICK", "5"))
+# Refrescos simultáneos como máximo
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "2"))
+# Intervalos de refresco (segundos) según urgencia
+SCHEDULER_URGENT_WINDOW = float(os.getenv("SCHEDULER_URGENT_WINDOW", "3600"))   # inWar a menos de esto del final...
+SCHEDULER_INTERVAL_URGENT = float(os.getenv("SCHEDULER_INTERVAL_URGENT", "30"))  # ...se refresca así de a menudo
+SCHEDULER_INTERVAL_IN_WAR = float(os.getenv("SCHEDULER_INTERVAL_IN_WAR", "120"))
+SCHEDULER_INTERVAL_PREPARATION = float(os.getenv("SCHEDULER_INTERVAL_PREPARATION", "900"))
+# Temporada terminada o sin CWL: no se refresca, solo se comprueba muy de vez en cuando
+SCHEDULER_INTERVAL_IDLE = float(os.getenv("SCHEDULER_INTERVAL_IDLE", "21600"))
+# Reintento tras un refresco fallido
+SCHEDULER_INTERVAL_ERROR = float(os.getenv("SCHEDULER_INTERVAL_ERROR", "60"))
+
+# =============================
+# 📦 Peticiones por lotes (varios clanes a la vez)
+# =============================
+BATCH_MAX_CLANS = int(os.getenv("BATCH_MAX_CLANS", "50"))
+
+# =============================
+# 🏆 Análisis por grupo CWL (compartido entre los clanes del grupo)
+# =============================
+GROUP_CACHE_MAX_ENTRIES = int(os.getenv("GROUP_CACHE_MAX_ENTRIES", "256"))
+
+# =============================
+# 🚫 Caché negativa (sin CWL / no encontrado / privado)
+# =============================
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", "5000"))
+# TTL (segundos) de un 404 (clan / guerra no encontrados)
+NEGATIVE_TTL_NOT_FOUND = float(os.getenv("NEGATIVE_TTL_NOT_FOUND", "3600"))
+# TTL (segundos) de un 403 (clan privado / registro de guerras oculto)
+NEGATIVE_TTL_PRIVATE = float(os.getenv("NEGATIVE_TTL_PRIVATE", "900"))
+# Sin CWL durante la inscripción: el clan puede apuntarse en cualquier momento
+NEGATIVE_TTL_SIGNUP = float(os.getenv("NEGATIVE_TTL_SIGNUP", "600"))
+
+# =============================
+# 📅 Calendario de la CWL
+# =============================
+# La inscripción abre el día CWL_SIGNUP_DAY de cada mes a CWL_SIGNUP_HOUR_UTC y dura CWL_SIGNUP_HOURS
+CWL_SIGNUP_DAY = int(os.getenv("CWL_SIGNUP_DAY", "1"))
+CWL_SIGNUP_HOUR_UTC = int(os.getenv("CWL_SIGNUP_HOUR_UTC", "8"))
+CWL_SIGNUP_HOURS = float(os.getenv("CWL_SIGNUP_HOURS", "48"))
+
+# =============================
+# 🗜️ Compresión de respuestas y estáticos
+# =============================
+# Respuestas más pequeñas que esto (bytes) se envían sin comprimir
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Calidad brotli para respuestas dinámicas (0-11; los estáticos se precomprimen a 11)
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+# Precomprimir /static al arrancar (.gz y, si hay brotli, .br junto a cada fichero)
+STATIC_PRECOMPRESS = _env_bool("STATIC_PRECOMPRESS", True)
+# Caché del navegador / proxy para /static (segundos)
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", str(365 * 24 * 3600)))
+
+# =============================
+# 📡 Actualizaciones en vivo (SSE)
+# =============================
+# Con alguien mirando un clan en vivo, su guerra inWar se refresca al menos así de a menudo
+LIVE_REFRESH_INTERVAL = float(os.getenv("LIVE_REFRESH_INTERVAL", "20"))
+# Comentario keep-alive cada tantos segundos sin eventos
+LIVE_HEARTBEAT = float(os.getenv("LIVE_HEARTBEAT", "15"))
+# Eventos pendientes por cliente; si se llena, se le reenvía el estado completo
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "100"))
+
+# =============================
+# 🧾 Respuestas delta (?since=)
+# =============================
+# Versiones recientes que se guardan por resumen para calcular deltas
+SNAPSHOT_HISTORY = int(os.getenv("SNAPSHOT_HISTORY", "16"))
+# Resúmenes distintos (clan + endpoint + secciones) con versiones guardadas
+SNAPSHOT_MAX_KEYS = int(os.getenv("SNAPSHOT_MAX_KEYS", "512"))
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+from .config import (
+    CWL_SIGNUP_DAY,
+    CWL_SIGNUP_HOUR_UTC,
+    CWL_SIGNUP_HOURS,
+    NEGATIVE_TTL_SIGNUP,
+)
+
+# =============================
+# 📅 Calendario de temporadas CWL
+# =============================
+# La CWL empieza una vez al mes: 2 días de inscripción y después las 7 rondas.
+# Un clan que no tiene grupo fuera de la inscripción ya no lo tendrá hasta el
+# mes siguiente, así que "sin CWL" se puede recordar hasta entonces.
+
+def _signup_start(year, month):
+    return datetime(year, month, CWL_SIGNUP_DAY, CWL_SIGNUP_HOUR_UTC, tzinfo=timezone.utc)
+
+def current_signup_start(now=None):
+    """Inicio de la inscripción de la temporada en curso (la última que ha abierto)."""
+    now = now or datetime.now(timezone.utc)
+    start = _signup_start(now.year, now.month)
+
+    if start > now:
+        year, month = (now.year - 1, 12) if now.month == 1 else (now.year, now.month - 1)
+        start = _signup_start(year, month)
+
+    return start
+
+def next_signup_start(now=None):
+    now = now or datetime.now(timezone.utc)
+    start = _signup_start(now.year, now.month)
+
+    if start <= now:
+        year, month = (now.year + 1, 1) if now.month == 12 else (now.year, now.month + 1)
+        start = _signup_start(year, month)
+
+    return start
+
+def in_signup_window(now=None) -> bool:
+    now = now or datetime.now(timezone.utc)
+    return now < current_signup_start(now) + timedelta(hours=CWL_SIGNUP_HOURS)
+
+def no_cwl_ttl(now=None) -> float:
+    """Segundos que vale un "sin CWL": poco en plena inscripción, si no hasta la próxima."""
+    now = now or datetime.now(timezone.utc)
+
+    if in_signup_window(now):
+        return NEGATIVE_TTL_SIGNUP
+
+    return max(NEGATIVE_TTL_SIGNUP, (next_signup_start(now) - now).total_seconds())
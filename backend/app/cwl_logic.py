@@ -1,15 +1,29 @@
+import asyncio
+import httpx
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime, timezone
 from .api_client import get_league_group_api, get_war_api, get_clan_info_api, get_normal_summary_api
+from . import group_cache
+from . import cwl_calendar
+from . import async_api_client
+from . import war_index
+from . import war_store
+from .normal_war_sim import estimate_normal_war_probs
+from .tables import cwl_ranking_columns, normal_ranking_columns
+from .rate_limiter import PRIORITY_LIVE, PRIORITY_NORMAL, PRIORITY_BACKFILL
 from .utils import get_league_info
 from .leagues import CWL_LEAGUES
-import random
+from .config import CWL_WAR_FETCH_CONCURRENCY, WIN_PROB_SIMULATIONS, WIN_PROB_METHOD, WIN_PROB_CACHE_SIZE
+import numpy as np
 
 
 def get_league_group(clan_tag):
     return get_league_group_api(clan_tag)
 
-def get_war(war_tag: str):
-    return get_war_api(war_tag)
+def get_war(war_tag: str, priority: int = PRIORITY_NORMAL):
+    return get_war_api(war_tag, priority)
 
 def get_clan_info(clan_tag: str):
     return get_clan_info_api(clan_tag)
@@ -17,26 +31,155 @@ def get_clan_info(clan_tag: str):
 def get_normal_summary(clan_tag: str):
     return get_normal_summary_api(clan_tag)
 
-def find_all_my_wars(group_json, clan_tag):
-    wars_list = []
+async def get_league_group_async(clan_tag):
+    return await async_api_client.get_league_group_api(clan_tag)
+
+async def get_war_async(war_tag: str, priority: int = PRIORITY_NORMAL):
+    return await async_api_client.get_war_api(war_tag, priority)
+
+async def get_clan_info_async(clan_tag: str):
+    return await async_api_client.get_clan_info_api(clan_tag)
 
+async def get_normal_summary_async(clan_tag: str):
+    return await async_api_client.get_normal_summary_api(clan_tag)
+
+def _iter_rounds(group_json):
     for round_idx, round_wars in enumerate(group_json.get("rounds", []), start=1):
-        war_tags_list = round_wars.get("warTags", [])
+        war_tags_list = [
+            war_tag for war_tag in round_wars.get("warTags", [])
+            if isinstance(war_tag, str) and war_tag.startswith("#") and war_tag != "#0"
+        ]
+
+        if war_tags_list:
+            yield round_idx, war_tags_list
+
+def _is_my_war(war, clan_tag):
+    return war["clan"]["tag"] == clan_tag or war["opponent"]["tag"] == clan_tag
+
+def _war_priority(war_tag):
+    # 🚦 La ronda en curso va primero; las ya finalizadas, al final de la cola
+    state = war_index.get_state(war_tag)
+
+    if state == "inWar":
+        return PRIORITY_LIVE
+    if state == "warEnded":
+        return PRIORITY_BACKFILL
+    return PRIORITY_NORMAL
+
+def _load_war(war_tag, round_idx):
+    # 💾 Las guerras finalizadas salen del almacén en disco
+    war = war_store.get_war(war_tag)
+    if war is not None:
+        return war
+
+    try:
+        war = get_war(war_tag, _war_priority(war_tag))
+    except Exception as e:
+        print(f"⚠️ No se pudo cargar warTag {war_tag}: {e}")
+        return None
+
+    war.setdefault("warTag", war_tag)
+    war_store.save_war(war_tag, round_idx, war)
+    return war
+
+async def _load_war_async(war_tag, round_idx, semaphore):
+    war = await asyncio.to_thread(war_store.get_war, war_tag)
+    if war is not None:
+        return war
+
+    async with semaphore:
+        try:
+            war = await get_war_async(war_tag, _war_priority(war_tag))
+        except Exception as e:
+            print(f"⚠️ No se pudo cargar warTag {war_tag}: {e}")
+            return None
+
+    war.setdefault("warTag", war_tag)
+    await asyncio.to_thread(war_store.save_war, war_tag, round_idx, war)
+    return war
+
+def _find_round_war(round_idx, war_tags, clan_tag):
+    # 🔎 Solo una guerra por ronda es nuestra: paramos en cuanto aparece
+    for war_tag in war_index.plan_round(war_tags, clan_tag):
+        war = _load_war(war_tag, round_idx)
+        if war is None:
+            continue
 
-        for war_tag in war_tags_list:
-            if not isinstance(war_tag, str) or not war_tag.startswith("#") or war_tag == "#0":
-                continue
+        war_index.index_war(war_tag, round_idx, war)
 
-            try:
-                war = get_war(war_tag)
-            except Exception as e:
-                print(f"⚠️ No se pudo cargar warTag {war_tag}: {e}")
-                continue
+        if _is_my_war(war, clan_tag):
+            return war
+
+    return None
+
+async def _find_round_war_async(round_idx, war_tags, clan_tag, semaphore):
+    for war_tag in war_index.plan_round(war_tags, clan_tag):
+        war = await _load_war_async(war_tag, round_idx, semaphore)
+        if war is None:
+            continue
 
-            if war["clan"]["tag"] == clan_tag or war["opponent"]["tag"] == clan_tag:
-                wars_list.append((war, round_idx))
+        war_index.index_war(war_tag, round_idx, war)
+
+        if _is_my_war(war, clan_tag):
+            return war
+
+    return None
+
+def find_all_my_wars(group_json, clan_tag):
+    rounds = list(_iter_rounds(group_json))
+    if not rounds:
+        return []
 
-    return wars_list
+    # ⚡ Rondas en paralelo (límite configurable); dentro de cada ronda, salida temprana
+    workers = max(1, min(CWL_WAR_FETCH_CONCURRENCY, len(rounds)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        wars = list(pool.map(
+            lambda r: _find_round_war(r[0], r[1], clan_tag),
+            rounds
+        ))
+
+    return [
+        (war, round_idx)
+        for (round_idx, _), war in zip(rounds, wars)
+        if war is not None
+    ]
+
+async def find_all_my_wars_async(group_json, clan_tag):
+    rounds = list(_iter_rounds(group_json))
+    semaphore = asyncio.Semaphore(max(1, CWL_WAR_FETCH_CONCURRENCY))
+
+    wars = await asyncio.gather(*(
+        _find_round_war_async(round_idx, war_tags, clan_tag, semaphore)
+        for round_idx, war_tags in rounds
+    ))
+
+    return [
+        (war, round_idx)
+        for (round_idx, _), war in zip(rounds, wars)
+        if war is not None
+    ]
+
+async def iter_my_wars_async(group_json, clan_tag):
+    """Como find_all_my_wars_async, pero entrega cada (war, round_idx) en cuanto se encuentra."""
+    semaphore = asyncio.Semaphore(max(1, CWL_WAR_FETCH_CONCURRENCY))
+
+    async def find(round_idx, war_tags):
+        return await _find_round_war_async(round_idx, war_tags, clan_tag, semaphore), round_idx
+
+    tasks = [
+        asyncio.ensure_future(find(round_idx, war_tags))
+        for round_idx, war_tags in _iter_rounds(group_json)
+    ]
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            war, round_idx = await next_done
+            if war is not None:
+                yield war, round_idx
+    finally:
+        # Cliente desconectado a medias: fuera las rondas pendientes
+        for task in tasks:
+            task.cancel()
 
 def parse_end_time(war):
     end_time_str = war.get("endTime")
@@ -274,121 +417,167 @@ def get_war_summary(war, clan_tag):
     }
 
 
-def get_full_cwl_summary(clan_tag: str):
-    group = get_league_group_api(clan_tag)
-    team_size = group.get("teamSize", 15)
-    strength_ranking = calculate_group_strength(group, clan_tag, team_size)
-    position_advantage = calculate_position_advantage(strength_ranking)
+def get_win_state(war, summary):
+    # Estrellas y ataques actuales
+    me_stars = summary['me_stars']
+    me_attacks_done = summary['me_attacks']
+    me_max_attacks = summary['me_max_attacks']
 
+    opp_stars = summary['opp_stars']
+    opp_attacks_done = summary['opp_attacks']
+    opp_max_attacks = summary['opp_max_attacks']
 
-    league_id = group.get("leagueId")
-    league_info = CWL_LEAGUES.get(league_id,{})
+    # Estimación de estrellas promedio por ataque restante
+    # Aquí puedes hacer algo más sofisticado usando weighted_score/top_th
+    war_state = war.get("state")
 
-    # Si no hay CWL activa o la API no devuelve rounds
-    if not group or not group.get("rounds"):
-        return {
-            "clan_tag": clan_tag,
-            "generated_at": datetime.now(timezone.utc).isoformat(),
-            "wars": [],
-            "no_cwl": True,
-            "message": "Este clan no tiene CWL activa actualmente."
-        }
+    if war_state == "warEnded":
 
+        # Resultado real definitivo
+        if me_stars > opp_stars:
+            return {
+                "status": "final_win",
+                "result_text": "Victoria"
+            }
+        elif me_stars < opp_stars:
+            return {
+                "status": "final_loss",
+                "result_text": "Derrota"
+            }
+        else:
+            return {
+                "status": "final_draw",
+                "result_text": "Empate"
+            }
 
-    wars_found = find_all_my_wars(group, clan_tag)
-    wars_payload = []
+    elif war_state == "inWar":
+
+        return realtime_war_state(
+            me_stars,
+            me_attacks_done,
+            me_max_attacks,
+            opp_stars,
+            opp_attacks_done,
+            opp_max_attacks,
+            summary["team_size"],
+            summary["attacks_per_member"],
+            simulations=WIN_PROB_SIMULATIONS,
+        )
 
-    for war, round_idx in wars_found:
-        # summary básico
-        summary = get_war_summary(war, clan_tag)
+    return {
+        "status": "not_started"
+    }
 
-        # ranking
-        ranking = get_attack_ranking_data(war, clan_tag)
+def build_war_payload(war, round_idx, clan_tag, include_ranking=True):
+    # summary básico
+    summary = get_war_summary(war, clan_tag)
 
-        # badges
-        if war["clan"]["tag"] == clan_tag:
-            me = war["clan"]
-            opp = war["opponent"]
-        else:
-            me = war["opponent"]
-            opp = war["clan"]
-
-
-        # Estrellas y ataques actuales
-        me_stars = summary['me_stars']
-        me_attacks_done = summary['me_attacks']
-        me_max_attacks = summary['me_max_attacks']
-
-        opp_stars = summary['opp_stars']
-        opp_attacks_done = summary['opp_attacks']
-        opp_max_attacks = summary['opp_max_attacks']
-
-        # Estimación de estrellas promedio por ataque restante
-        # Aquí puedes hacer algo más sofisticado usando weighted_score/top_th
-        war_state = war.get("state")
-
-        if war_state == "warEnded":
-
-            # Resultado real definitivo
-            if me_stars > opp_stars:
-                prob_data = {
-                    "status": "final_win",
-                    "result_text": "Victoria"
-                }
-            elif me_stars < opp_stars:
-                prob_data = {
-                    "status": "final_loss",
-                    "result_text": "Derrota"
-                }
-            else:
-                prob_data = {
-                    "status": "final_draw",
-                    "result_text": "Empate"
-                }
-
-        elif war_state == "inWar":
-
-            prob_data = realtime_war_state(
-                me_stars,
-                me_attacks_done,
-                me_max_attacks,
-                opp_stars,
-                opp_attacks_done,
-                opp_max_attacks,
-                summary["team_size"],
-                summary["attacks_per_member"]
-            )
+    # ranking (solo si se pide)
+    ranking = get_attack_ranking_data(war, clan_tag) if include_ranking else None
 
-        else:
-            prob_data = {
-                "status": "not_started"
-            }
+    # badges
+    if war["clan"]["tag"] == clan_tag:
+        me = war["clan"]
+        opp = war["opponent"]
+    else:
+        me = war["opponent"]
+        opp = war["clan"]
 
+    return {
+        "round": round_idx,
+        "state": war.get("state"),
+        "end_time": war.get("endTime"),
+        "time_left": get_time_left(war.get("endTime")),
 
-        wars_payload.append({
-            "round": round_idx,
-            "state": war.get("state"),
-            "end_time": war.get("endTime"),
-            "time_left": get_time_left(war.get("endTime")),
-
-            "me": {
-                "name": me.get("name"),
-                "badge": me.get("badgeUrls", {}).get("small"),
-            },
-            "opp": {
-                "name": opp.get("name"),
-                "badge": opp.get("badgeUrls", {}).get("small"),
-            },
-
-            "summary": summary,
-            "ranking": ranking,
-            "win_state": prob_data,
-        })
+        "me": {
+            "name": me.get("name"),
+            "badge": me.get("badgeUrls", {}).get("small"),
+        },
+        "opp": {
+            "name": opp.get("name"),
+            "badge": opp.get("badgeUrls", {}).get("small"),
+        },
+
+        "summary": summary,
+        **({"ranking": ranking} if include_ranking else {}),
+        "win_state": get_win_state(war, summary),
+    }
+
+def get_war_payload(war, round_idx, clan_tag, include_ranking=True):
+    """
+    Como build_war_payload, pero para guerras finalizadas el resultado se guarda
+    en disco junto a la guerra cruda y no se vuelve a calcular.
+    """
+    war_tag = war.get("warTag")
+
+    if war.get("state") != "warEnded" or not war_tag:
+        return build_war_payload(war, round_idx, clan_tag, include_ranking)
+
+    # En disco siempre el payload completo
+    payload = war_store.get_payload(war_tag, clan_tag)
+    if payload is None:
+        payload = build_war_payload(war, round_idx, clan_tag)
+        war_store.save_payload(war_tag, clan_tag, payload)
 
+    return payload if include_ranking else _without(payload, ("ranking",))
+
+# =============================
+# ✂️ Secciones opcionales de las respuestas (?include=)
+# =============================
+CWL_SECTIONS = ("wars", "ranking", "ranking_table", "strength_ranking", "position_advantage", "group_raw")
+NORMAL_WAR_SECTIONS = ("summary", "ranking", "full_war_data")
+
+def parse_sections(include, allowed):
+    """
+    "wars,ranking" → {"wars", "ranking"}. Sin include, todas las secciones.
+    ValueError si se pide una sección que no existe.
+    """
+    if include is None:
+        return set(allowed)
+
+    sections = {part.strip() for part in include.split(",") if part.strip()}
+    unknown = sections - set(allowed)
+    if unknown:
+        raise ValueError(
+            f"Secciones desconocidas: {', '.join(sorted(unknown))} (válidas: {', '.join(allowed)})"
+        )
+    return sections
+
+def _without(data, keys):
+    return {k: v for k, v in data.items() if k not in keys}
+
+def project_cwl_summary(summary, sections):
+    """Recorta un resumen CWL completo a las secciones pedidas."""
+    dropped = [s for s in CWL_SECTIONS if s not in sections and s != "ranking"]
+    projected = _without(summary, dropped)
+
+    if "ranking" not in sections and projected.get("wars"):
+        projected["wars"] = [_without(w, ("ranking",)) for w in projected["wars"]]
+
+    return projected
+
+def _no_cwl_summary(clan_tag: str):
     return {
+        "clan_tag": clan_tag,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "wars": [],
+        "no_cwl": True,
+        "message": "Este clan no tiene CWL activa actualmente.",
+        "next_signup": cwl_calendar.next_signup_start().isoformat(),
+    }
+
+def _build_full_cwl_summary(clan_tag, group, sections, wars_payload, ranking_table,
+                            strength_ranking, position_advantage):
+    team_size = group.get("teamSize", 15)
+    league_id = group.get("leagueId")
+    league_info = CWL_LEAGUES.get(league_id,{})
+
+    summary = {
         "clan_tag": clan_tag,
         "generated_at": datetime.now(timezone.utc).isoformat(),
         "wars": wars_payload,
+        # 📊 Columnas tipadas (tables.CWL_RANKING_SCHEMA) de todas las rondas
+        "ranking_table": ranking_table,
         "league": {
         "id": league_id,
         "name": league_info.get("name", "Unknown League"),
@@ -400,10 +589,176 @@ def get_full_cwl_summary(clan_tag: str):
         "team_size": team_size,
     }
 
-def get_normal_war_summary(clan_tag: str):
-    war = get_normal_summary(clan_tag)  # esto ya llama a /currentwar → devuelve la guerra completa
+    return project_cwl_summary(summary, sections)
+
+def _shared_group_analysis(group, team_size):
+    # Todo lo que no depende de qué clan mira: ranking y diferencias por posición entre cada par
+    rows = _group_strength_rows(group, team_size)
+    position_diffs = {
+        (my_tag, opp_tag): _avg_position_diff(me["top_members"], opp["top_members"])
+        for my_tag, me in rows
+        for opp_tag, opp in rows
+        if opp_tag != my_tag
+    }
+    return rows, position_diffs
+
+def _group_analysis(group, clan_tag, team_size):
+    # 🏆 Calculado una vez por grupo; aquí solo la vista de este clan
+    rows, position_diffs = group_cache.get_or_compute(
+        group_cache.group_key(group, team_size),
+        lambda: _shared_group_analysis(group, team_size),
+    )
+
+    strength_ranking = [{**row, "is_me": tag == clan_tag} for tag, row in rows]
+    position_advantage = [
+        {
+            "opponent": row["name"],
+            "avg_position_diff": position_diffs[(clan_tag, tag)],
+        }
+        for tag, row in rows
+        if tag != clan_tag and (clan_tag, tag) in position_diffs
+    ]
+    return strength_ranking, position_advantage
+
+def _requested_group_analysis(group, clan_tag, sections):
+    # Ni ranking de fuerza ni ventaja por posición pedidos → no se calcula nada
+    if "strength_ranking" not in sections and "position_advantage" not in sections:
+        return None, None
+    return _group_analysis(group, clan_tag, group.get("teamSize", 15))
+
+def get_full_cwl_summary(clan_tag: str, sections=None):
+    sections = set(CWL_SECTIONS) if sections is None else sections
+
+    try:
+        group = get_league_group_api(clan_tag)
+    except requests.HTTPError as e:
+        # 404 del grupo = el clan no está en CWL (queda en la caché negativa)
+        if e.response is not None and e.response.status_code == 404:
+            return _no_cwl_summary(clan_tag)
+        raise
+
+    # Si no hay CWL activa o la API no devuelve rounds
+    if not group or not group.get("rounds"):
+        return _no_cwl_summary(clan_tag)
+
+    strength_ranking, position_advantage = _requested_group_analysis(group, clan_tag, sections)
+
+    wars_found = find_all_my_wars(group, clan_tag) if sections & {"wars", "ranking_table"} else []
+
+    wars_payload = None
+    if "wars" in sections:
+        include_ranking = "ranking" in sections
+        wars_payload = [
+            get_war_payload(war, round_idx, clan_tag, include_ranking)
+            for war, round_idx in wars_found
+        ]
+
+    ranking_table = cwl_ranking_columns(wars_found, clan_tag) if "ranking_table" in sections else None
+
+    return _build_full_cwl_summary(
+        clan_tag, group, sections, wars_payload, ranking_table, strength_ranking, position_advantage,
+    )
+
+async def get_full_cwl_summary_async(clan_tag: str, sections=None):
+    sections = set(CWL_SECTIONS) if sections is None else sections
+
+    try:
+        group = await get_league_group_async(clan_tag)
+    except httpx.HTTPStatusError as e:
+        # 404 del grupo = el clan no está en CWL (queda en la caché negativa)
+        if e.response.status_code == 404:
+            return _no_cwl_summary(clan_tag)
+        raise
+
+    # Si no hay CWL activa o la API no devuelve rounds
+    if not group or not group.get("rounds"):
+        return _no_cwl_summary(clan_tag)
+
+    strength_ranking, position_advantage = _requested_group_analysis(group, clan_tag, sections)
+
+    wars_found = await find_all_my_wars_async(group, clan_tag) if sections & {"wars", "ranking_table"} else []
+
+    wars_payload = None
+    if "wars" in sections:
+        include_ranking = "ranking" in sections
+        wars_payload = [
+            await _war_payload_async(war, round_idx, clan_tag, include_ranking)
+            for war, round_idx in wars_found
+        ]
+
+    ranking_table = cwl_ranking_columns(wars_found, clan_tag) if "ranking_table" in sections else None
+
+    return _build_full_cwl_summary(
+        clan_tag, group, sections, wars_payload, ranking_table, strength_ranking, position_advantage,
+    )
+
+async def _war_payload_async(war, round_idx, clan_tag, include_ranking):
+    if war.get("state") in ("inWar", "warEnded"):
+        # 🎲 Monte Carlo (inWar) y disco (warEnded): fuera del event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, get_war_payload, war, round_idx, clan_tag, include_ranking)
+    return build_war_payload(war, round_idx, clan_tag, include_ranking)
+
+# =============================
+# 🌊 Resumen CWL por partes (NDJSON)
+# =============================
+# Primero una cabecera (liga, ranking de fuerza...), luego una línea por guerra
+# según van llegando y al final {"type": "end"}.
+
+def _stream_end(sent, ranking_table):
+    end = {"type": "end", "wars": sent}
+    if ranking_table is not None:
+        end["ranking_table"] = ranking_table
+    return end
+
+def summary_stream_lines(summary):
+    """Un resumen ya calculado, troceado como el stream."""
+    yield {"type": "header", **_without(summary, ("wars", "ranking_table"))}
+    wars = summary.get("wars") or []
+    for payload in wars:
+        yield {"type": "war", **payload}
+    yield _stream_end(len(wars), summary.get("ranking_table"))
+
+async def stream_full_cwl_summary_async(clan_tag: str, sections=None):
+    sections = set(CWL_SECTIONS) if sections is None else sections
+
+    try:
+        group = await get_league_group_async(clan_tag)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            group = None
+        else:
+            raise
+
+    if not group or not group.get("rounds"):
+        for line in summary_stream_lines(_no_cwl_summary(clan_tag)):
+            yield line
+        return
+
+    strength_ranking, position_advantage = _requested_group_analysis(group, clan_tag, sections)
+    header = _build_full_cwl_summary(clan_tag, group, sections, None, None, strength_ranking, position_advantage)
+    yield {"type": "header", **_without(header, ("wars", "ranking_table"))}
+
+    # La tabla de ranking necesita todas las rondas: va en la línea "end"
+    wars_found = []
+    if sections & {"wars", "ranking_table"}:
+        include_ranking = "ranking" in sections
+        async for war, round_idx in iter_my_wars_async(group, clan_tag):
+            wars_found.append((war, round_idx))
+            if "wars" in sections:
+                payload = await _war_payload_async(war, round_idx, clan_tag, include_ranking)
+                yield {"type": "war", **payload}
+
+    sent = len(wars_found) if "wars" in sections else 0
+    ranking_table = cwl_ranking_columns(wars_found, clan_tag) if "ranking_table" in sections else None
+    yield _stream_end(sent, ranking_table)
+
+def build_normal_war_summary(war, clan_tag: str, sections=None):
+    sections = set(NORMAL_WAR_SECTIONS) if sections is None else sections
+    dropped = [s for s in NORMAL_WAR_SECTIONS if s not in sections]
+
     if not war or war.get("state") == "notInWar":
-        return {
+        return _without({
             "state": "notInWar",
             "time_left": None,
             "summary": None,
@@ -411,19 +766,19 @@ def get_normal_war_summary(clan_tag: str):
             "me": None,
             "opp": None,
             "full_war_data": None  # para debug
-        }
+        }, dropped)
 
     # Calculamos time_left
     time_left = get_time_left(war.get("endTime"))
 
     # Summary (lo mantenemos igual)
-    summary = get_war_summary(war, clan_tag)
+    summary = get_war_summary(war, clan_tag) if "summary" in sections else None
 
     # Ranking (lo mantenemos, pero ahora usaremos el detalle real para bases)
-    ranking = get_attack_ranking_data_normal(war, clan_tag)
+    ranking = get_attack_ranking_data_normal(war, clan_tag) if "ranking" in sections else None
 
     # Devolvemos TODO el objeto war completo + lo que ya tenías
-    return {
+    return _without({
         "state": war.get("state"),
         "time_left": time_left,
         "summary": summary,
@@ -439,13 +794,31 @@ def get_normal_war_summary(clan_tag: str):
             "tag": war["opponent"].get("tag")
         },
         "full_war_data": war  # ← ¡AQUÍ ESTÁ LA CLAVE! Enviamos la guerra completa
-    }
+    }, dropped)
 
+def get_normal_war_summary(clan_tag: str, sections=None):
+    war = get_normal_summary(clan_tag)  # esto ya llama a /currentwar → devuelve la guerra completa
+    return build_normal_war_summary(war, clan_tag, sections)
 
+async def get_normal_war_summary_async(clan_tag: str, sections=None):
+    war = await get_normal_summary_async(clan_tag)
+    return build_normal_war_summary(war, clan_tag, sections)
 
+async def get_normal_ranking_columns_async(clan_tag: str):
+    war = await get_normal_summary_async(clan_tag)
+    return normal_ranking_columns(war, clan_tag)
 
+async def get_normal_war_probabilities_async(clan_tag: str):
+    # 🎲 Simulación con targeting (numpy, fuera del event loop)
+    war = await get_normal_summary_async(clan_tag)
+    return await asyncio.to_thread(estimate_normal_war_probs, war, clan_tag)
 
-def calculate_group_strength(group_json, my_clan_tag, war_size):
+
+
+
+
+def _group_strength_rows(group_json, war_size):
+    # [(tag, fila)] ordenado por fuerza; la fila aún sin is_me
     clans = group_json.get("clans", [])
     results = []
 
@@ -472,25 +845,43 @@ def calculate_group_strength(group_json, my_clan_tag, war_size):
             for i, th in enumerate(top_ths)
         )
 
-        results.append({
+        results.append((clan["tag"], {
             "rank": 0,
             "name": clan["name"],
             "top_avg_th": round(avg_th, 2),
             "weighted_score": weighted_score,
             "top_members": top_members, 
-            "is_me": clan["tag"] == my_clan_tag
-        })
+            "is_me": False
+        }))
 
     results.sort(
-        key=lambda x: x["weighted_score"],
+        key=lambda x: x[1]["weighted_score"],
         reverse=True
     )
 
-    for i, r in enumerate(results, start=1):
+    for i, (_, r) in enumerate(results, start=1):
         r["rank"] = i
 
     return results
 
+def calculate_group_strength(group_json, my_clan_tag, war_size):
+    return [
+        {**row, "is_me": tag == my_clan_tag}
+        for tag, row in _group_strength_rows(group_json, war_size)
+    ]
+
+def _avg_position_diff(my_top_members, opp_top_members):
+    diff_sum = 0
+    positions = len(my_top_members)
+
+    for i in range(positions):
+        my_th = my_top_members[i].get("townHallLevel", 0)
+        opp_th = opp_top_members[i].get("townHallLevel", 0)
+        diff_sum += my_th - opp_th
+
+    avg_diff = diff_sum / positions
+    return round(avg_diff, 2)
+
 def calculate_position_advantage(strength_data):
     my_clan = next(c for c in strength_data if c["is_me"])
 
@@ -500,25 +891,89 @@ def calculate_position_advantage(strength_data):
         if clan["is_me"]:
             continue
 
-        diff_sum = 0
-        positions = len(my_clan["top_members"])
-
-        for i in range(positions):
-            my_th = my_clan["top_members"][i].get("townHallLevel", 0)
-            opp_th = clan["top_members"][i].get("townHallLevel", 0)
-            diff_sum += my_th - opp_th
-
-        avg_diff = diff_sum / positions
-
         comparisons.append({
             "opponent": clan["name"],
-            "avg_position_diff": round(avg_diff, 2)
+            "avg_position_diff": _avg_position_diff(my_clan["top_members"], clan["top_members"])
         })
 
     return comparisons
 
 
 
+_rng = np.random.default_rng()
+
+def _star_pmf(star_distribution):
+    """
+    Probabilidad de sacar 0, 1, 2, 3... estrellas en un ataque, igual que el recorrido
+    acumulado original: lo que pase de 1 se ignora y lo que falte cuenta como 0 estrellas.
+    """
+    pmf = np.zeros(max(star_distribution, default=0) + 1)
+    cumulative = 0.0
+
+    for star, prob in star_distribution.items():
+        pmf[star] += max(0.0, min(cumulative + prob, 1.0) - min(cumulative, 1.0))
+        cumulative += prob
+
+    pmf[0] += max(0.0, 1.0 - pmf.sum())
+    return pmf
+
+def _extra_stars_pmf(attacks_left, star_distribution):
+    # Distribución de las estrellas extra con attacks_left ataques i.i.d.: la de un
+    # ataque convolucionada attacks_left veces (por cuadrados, ~log2 convoluciones)
+    power = _star_pmf(star_distribution)
+    total = np.ones(1)
+    while attacks_left:
+        if attacks_left & 1:
+            total = np.convolve(total, power)
+        attacks_left >>= 1
+        if attacks_left:
+            power = np.convolve(power, power)
+    return total
+
+# Resolución del muestreo por ataque (probabilidades en milésimas)
+_RESOLUTION = 1000
+
+def _star_table(star_distribution):
+    # CDF inversa de un ataque: estrellas si la tirada sale k/_RESOLUTION
+    cdf = np.cumsum(_star_pmf(star_distribution))
+    thresholds = np.round(cdf / cdf[-1] * _RESOLUTION)
+    table = (np.arange(_RESOLUTION)[:, None] >= thresholds).sum(axis=1)
+    return np.minimum(table, len(cdf) - 1).astype(np.int8)
+
+def _simulated_stars(attacks_left, star_distribution, simulations):
+    # Estrellas extra de cada simulación: una tirada categórica por ataque
+    # (matriz simulaciones x ataques sobre la tabla de un ataque) y suma por fila
+    if attacks_left == 0:
+        return np.zeros(simulations, dtype=np.int64)
+
+    table = _star_table(star_distribution)
+    draws = _rng.integers(0, _RESOLUTION, (simulations, attacks_left), dtype=np.int16)
+    return table.take(draws).sum(axis=1, dtype=np.int64)
+
+def _final_stars_pmf(stars, attacks_left, star_distribution, max_possible_stars):
+    # Distribución exacta de las estrellas finales (0..max_possible_stars) con el tope aplicado
+    extra = _extra_stars_pmf(attacks_left, star_distribution)
+    final = np.zeros(max_possible_stars + 1)
+
+    reachable = max(0, min(len(extra), max_possible_stars - stars))
+    final[stars:stars + reachable] = extra[:reachable]
+    final[max_possible_stars] += extra[reachable:].sum()
+    return final / final.sum()
+
+def _exact_outcome(me_stars, me_left, opp_stars, opp_left, max_possible_stars,
+                   star_distribution_me, star_distribution_opp):
+    me = _final_stars_pmf(me_stars, me_left, star_distribution_me, max_possible_stars)
+    opp = _final_stars_pmf(opp_stars, opp_left, star_distribution_opp, max_possible_stars)
+
+    # P(rival por debajo de i estrellas) para cada i
+    opp_below = np.concatenate(([0.0], np.cumsum(opp)[:-1]))
+
+    win = float(me @ opp_below)
+    draw = float(me @ opp)
+    return win, max(0.0, 1.0 - win - draw), draw
+
+_DEFAULT_STAR_DISTRIBUTION = {3: 0.35, 2: 0.30, 1: 0.20, 0: 0.15}
+
 def realtime_war_state(
     me_stars, me_attacks_done, me_max_attacks,
     opp_stars, opp_attacks_done, opp_max_attacks,
@@ -526,8 +981,46 @@ def realtime_war_state(
     attacks_per_member,
     star_distribution_me=None,
     star_distribution_opp=None,
-    simulations=10000
+    simulations=10000,
+    method=None,
 ):
+    """
+    Probabilidad de victoria / derrota / empate de una guerra en curso, con
+    ataques restantes independientes según star_distribution_*.
+    method: "exact" (convolución, sin ruido) o "montecarlo"; por defecto WIN_PROB_METHOD.
+    """
+    method = method or WIN_PROB_METHOD
+    if method not in ("exact", "montecarlo"):
+        raise ValueError(f"Método desconocido: {method}")
+
+    # 🧠 Memoizado por estado de la guerra: mientras nadie ataque, es una consulta al LRU.
+    # Las distribuciones van como tuplas en su orden (el orden importa si suman más de 1).
+    result = _cached_war_state(
+        me_stars, me_attacks_done, me_max_attacks,
+        opp_stars, opp_attacks_done, opp_max_attacks,
+        team_size,
+        attacks_per_member,
+        tuple((_DEFAULT_STAR_DISTRIBUTION if star_distribution_me is None else star_distribution_me).items()),
+        tuple((_DEFAULT_STAR_DISTRIBUTION if star_distribution_opp is None else star_distribution_opp).items()),
+        simulations if method == "montecarlo" else 0,
+        method,
+    )
+    # Copia: el resultado cacheado se comparte
+    return dict(result)
+
+@lru_cache(maxsize=WIN_PROB_CACHE_SIZE)
+def _cached_war_state(
+    me_stars, me_attacks_done, me_max_attacks,
+    opp_stars, opp_attacks_done, opp_max_attacks,
+    team_size,
+    attacks_per_member,
+    star_distribution_me,
+    star_distribution_opp,
+    simulations,
+    method,
+):
+    star_distribution_me = dict(star_distribution_me)
+    star_distribution_opp = dict(star_distribution_opp)
 
     # =============================
     # ⭐ Máximo real de estrellas
@@ -540,15 +1033,6 @@ def realtime_war_state(
     me_left = max(0, me_max_attacks - me_attacks_done)
     opp_left = max(0, opp_max_attacks - opp_attacks_done)
 
-    # =============================
-    # 🎲 Distribuciones por defecto
-    # =============================
-    if star_distribution_me is None:
-        star_distribution_me = {3: 0.35, 2: 0.30, 1: 0.20, 0: 0.15}
-
-    if star_distribution_opp is None:
-        star_distribution_opp = {3: 0.35, 2: 0.30, 1: 0.20, 0: 0.15}
-
     # =============================
     # 🟢 CIERRES MATEMÁTICOS REALES
     # =============================
@@ -581,47 +1065,36 @@ def realtime_war_state(
         }
 
     # =============================
-    # 🎯 MONTE CARLO REAL
+    # 🧮 EXACTO: convolución de las distribuciones
     # =============================
-    wins = 0
-    losses = 0
-    draws = 0
-
-    for _ in range(simulations):
-
-        me_final = me_stars
-        opp_final = opp_stars
-
-        # Simular ataques míos
-        for _ in range(me_left):
-            r = random.random()
-            cumulative = 0
-            for stars, prob in star_distribution_me.items():
-                cumulative += prob
-                if r <= cumulative:
-                    me_final += stars
-                    break
-
-        # Simular ataques rival
-        for _ in range(opp_left):
-            r = random.random()
-            cumulative = 0
-            for stars, prob in star_distribution_opp.items():
-                cumulative += prob
-                if r <= cumulative:
-                    opp_final += stars
-                    break
-
-        # Limitar al máximo real
-        me_final = min(me_final, max_possible_stars)
-        opp_final = min(opp_final, max_possible_stars)
-
-        if me_final > opp_final:
-            wins += 1
-        elif me_final < opp_final:
-            losses += 1
-        else:
-            draws += 1
+    if method == "exact":
+        win, loss, draw = _exact_outcome(
+            me_stars, me_left, opp_stars, opp_left, max_possible_stars,
+            star_distribution_me, star_distribution_opp,
+        )
+        return {
+            "status": "open_war",
+            "win_probability": round(win * 100, 1),
+            "lose_probability": round(loss * 100, 1),
+            "draw_probability": round(draw * 100, 1),
+        }
+
+    # =============================
+    # 🎯 MONTE CARLO REAL (vectorizado)
+    # =============================
+    # Todas las simulaciones de golpe: estrellas de cada bando, tope y recuento
+    me_final = np.minimum(
+        me_stars + _simulated_stars(me_left, star_distribution_me, simulations),
+        max_possible_stars,
+    )
+    opp_final = np.minimum(
+        opp_stars + _simulated_stars(opp_left, star_distribution_opp, simulations),
+        max_possible_stars,
+    )
+
+    wins = int(np.count_nonzero(me_final > opp_final))
+    losses = int(np.count_nonzero(me_final < opp_final))
+    draws = simulations - wins - losses
 
     return {
         "status": "open_war",
@@ -633,3 +1106,14 @@ def realtime_war_state(
 
 
 
+
+def get_win_state_cache_stats():
+    info = _cached_war_state.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "entries": info.currsize,
+        "max_entries": info.maxsize,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_ratio": round(info.hits / lookups, 3) if lookups else 0.0,
+    }
@@ -1,4 +1,5 @@
 from .api_client import get_clan_info_api
+from . import async_api_client
 import os
 
 
@@ -10,6 +11,16 @@ def get_clan_donations(clan_tag):
 
     print(BACKEND_URL)
 
+    return build_clan_donations(clan)
+
+async def get_clan_donations_async(clan_tag):
+
+    clan = await async_api_client.get_clan_info_api(clan_tag)
+
+    return build_clan_donations(clan)
+
+def build_clan_donations(clan):
+
     members_data = []
 
     for m in clan["memberList"]:
@@ -0,0 +1,53 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from .config import GROUP_CACHE_MAX_ENTRIES
+
+# =============================
+# 🏆 Caché de cálculos a nivel de grupo CWL
+# =============================
+# Los 8 clanes de un grupo ven el mismo ranking de fuerza (salvo is_me): se calcula
+# una vez por (temporada, clanes del grupo, tamaño de guerra, hash de plantillas) y
+# cada clan solo proyecta su vista. Si cambia una plantilla, cambia la clave.
+
+_entries = OrderedDict()  # clave → resultado compartido (solo lectura)
+_lock = threading.Lock()
+_stats = {
+    "hits": 0,
+    "misses": 0,
+}
+
+def group_key(group, team_size):
+    roster = sorted(
+        (
+            clan.get("tag"),
+            tuple(sorted((m.get("tag"), m.get("townHallLevel")) for m in clan.get("members", []))),
+        )
+        for clan in group.get("clans", [])
+    )
+    roster_hash = hashlib.sha1(repr(roster).encode("utf-8")).hexdigest()
+    return (group.get("season"), tuple(tag for tag, _ in roster), team_size, roster_hash)
+
+def get_or_compute(key, fn):
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return _entries[key]
+        _stats["misses"] += 1
+
+    value = fn()
+
+    with _lock:
+        _entries[key] = value
+        while len(_entries) > GROUP_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+    return value
+
+def get_group_cache_stats():
+    with _lock:
+        return {
+            "entries": len(_entries),
+            **_stats,
+        }
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from .config import LIVE_HEARTBEAT, LIVE_QUEUE_SIZE
+from . import scheduler
+from .war_diff import diff_summary
+
+# =============================
+# 📡 Actualizaciones en vivo por SSE
+# =============================
+# Un solo sondeo por clan, el del planificador: mientras alguien mira un clan,
+# el planificador lo vigila (más a menudo si está inWar) y cada resumen nuevo se
+# compara con el anterior. Solo los cambios (ataques, totales, win_state) se
+# reparten a todos los clientes conectados: N espectadores = 1 sondeo.
+
+_subscribers = {}  # clan_tag → set de asyncio.Queue
+_last = {}         # clan_tag → último resumen enviado
+_versions = {}     # clan_tag → nº de versión (sube con cada cambio)
+_stats = {
+    "events": 0,
+    "resyncs": 0,
+}
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _snapshot(clan_tag):
+    return {
+        "type": "snapshot",
+        "clan_tag": clan_tag,
+        "version": _versions.get(clan_tag, 0),
+        "summary": _last[clan_tag],
+    }
+
+def _deliver(queue, event, clan_tag):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # Cliente lento: se vacía su cola y recibe el estado completo
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_snapshot(clan_tag))
+        _stats["resyncs"] += 1
+
+def publish(clan_tag: str, summary):
+    """Listener del planificador: reparte lo que ha cambiado desde el último resumen."""
+    queues = _subscribers.get(clan_tag)
+    if not queues:
+        return
+
+    previous = _last.get(clan_tag)
+    _last[clan_tag] = summary
+    if previous is None:
+        return
+
+    changes = diff_summary(previous, summary)
+    if not changes:
+        return
+
+    _versions[clan_tag] = _versions.get(clan_tag, 0) + 1
+    event = {
+        "type": "update",
+        "clan_tag": clan_tag,
+        "version": _versions[clan_tag],
+        "generated_at": summary.get("generated_at"),
+        "changes": changes,
+    }
+    _stats["events"] += 1
+
+    for queue in list(queues):
+        _deliver(queue, event, clan_tag)
+
+scheduler.add_listener(publish)
+
+async def sse_stream(clan_tag: str):
+    """Eventos SSE de un clan: primero "snapshot" completo y después solo "update"."""
+    clan_tag = scheduler.normalize(clan_tag)
+    queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+
+    _subscribers.setdefault(clan_tag, set()).add(queue)
+    scheduler.watch(clan_tag)
+
+    try:
+        summary = await scheduler.get_or_compute(clan_tag)
+        _last.setdefault(clan_tag, summary)
+        yield _event("snapshot", _snapshot(clan_tag))
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), LIVE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+
+            yield _event(event["type"], event)
+    finally:
+        queues = _subscribers.get(clan_tag, set())
+        queues.discard(queue)
+        if not queues:
+            _subscribers.pop(clan_tag, None)
+            _last.pop(clan_tag, None)
+        scheduler.unwatch(clan_tag)
+
+def get_live_stats():
+    return {
+        "clans": len(_subscribers),
+        "viewers": sum(len(queues) for queues in _subscribers.values()),
+        **_stats,
+    }
@@ -1,38 +1,262 @@
-from fastapi import FastAPI
-from .cwl_logic import get_league_group, get_war_summary, get_full_cwl_summary, get_clan_info, get_normal_war_summary
-from .donations_logic import get_clan_donations
-from fastapi.staticfiles import StaticFiles
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import List, Optional
+import httpx
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from .cwl_logic import (
+    CWL_SECTIONS,
+    NORMAL_WAR_SECTIONS,
+    parse_sections,
+    project_cwl_summary,
+    stream_full_cwl_summary_async,
+    summary_stream_lines,
+    get_war_summary,
+    get_league_group_async,
+    get_clan_info_async,
+    get_normal_war_summary_async,
+    get_normal_war_probabilities_async,
+    get_normal_ranking_columns_async,
+    get_win_state_cache_stats,
+)
+from .normal_war_sim import get_normal_war_sim_stats
+from .donations_logic import get_clan_donations_async
+from .api_client import get_connection_stats, close_session
+from .async_api_client import close_client, get_async_connection_stats
+from .war_index import get_index_stats
+from .war_store import get_store_stats
+from .response_cache import get_cache_stats
+from .singleflight import get_singleflight_stats
+from .rate_limiter import get_rate_limiter_stats
+from .conditional import get_conditional_stats
+from .group_cache import get_group_cache_stats
+from .negative_cache import get_negative_cache_stats
+from .token_pool import get_token_pool_stats
+from .resilience import CircuitOpenError, get_resilience_stats
+from . import scheduler
+from . import tables
+from . import live_updates
+from . import snapshots
+from .war_diff import diff_cwl_summary, diff_normal_war
+from .config import BATCH_MAX_CLANS, STATIC_PRECOMPRESS
+from .compression import CompressionMiddleware, PrecompressedStaticFiles, precompress_static
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if STATIC_PRECOMPRESS:
+        await asyncio.to_thread(precompress_static, "static")
+    scheduler.start()
+    yield
+    await scheduler.stop()
+    await close_client()
+    close_session()
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+
+app = FastAPI(lifespan=lifespan)
+
+# 🗜️ JSON grandes (group_raw, full_war_data) comprimidos según Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+@app.exception_handler(httpx.HTTPStatusError)
+async def upstream_status_handler(request: Request, exc: httpx.HTTPStatusError):
+    # 🚫 Clan privado / inexistente: el mismo código que la API, no un 500
+    status = exc.response.status_code
+    if status == 403:
+        return JSONResponse(status_code=403, content={"detail": "Clan privado o sin acceso"})
+    if status == 404:
+        return JSONResponse(status_code=404, content={"detail": "Clan no encontrado"})
+    return JSONResponse(status_code=502, content={"detail": f"Error de la API de Clash of Clans ({status})"})
+
+def _sections(include, allowed):
+    # ✂️ ?include=wars,ranking → solo esas secciones (y solo esas se calculan)
+    try:
+        return parse_sections(include, allowed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _table_response(columns, schema, format):
+    # 📊 Arrow IPC (por defecto) o JSON columnar
+    if format == "json":
+        return {"columns": columns}
+
+    if format != "arrow":
+        raise HTTPException(status_code=400, detail="format debe ser 'arrow' o 'json'")
+
+    if not tables.arrow_available():
+        raise HTTPException(status_code=406, detail="pyarrow no está instalado en el backend: usa format=json")
+
+    return Response(content=tables.to_arrow_ipc(columns, schema), media_type=tables.ARROW_MEDIA_TYPE)
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        # Conexiones hacia la API: httpx (todas las rutas async) y requests (solo las síncronas)
+        "http": {
+            "async": get_async_connection_stats(),
+            "sync": get_connection_stats(),
+        },
+        "cache": get_cache_stats(),
+        "singleflight": get_singleflight_stats(),
+        "rate_limiter": get_rate_limiter_stats(),
+        "tokens": get_token_pool_stats(),
+        "resilience": get_resilience_stats(),
+        "conditional": get_conditional_stats(),
+        "negative_cache": get_negative_cache_stats(),
+        "group_cache": get_group_cache_stats(),
+        "win_probability": get_win_state_cache_stats(),
+        "normal_war_sim": get_normal_war_sim_stats(),
+        "war_index": get_index_stats(),
+        "war_store": get_store_stats(),
+        "scheduler": scheduler.get_scheduler_stats(),
+        "live": live_updates.get_live_stats(),
+        "snapshots": snapshots.get_snapshot_stats(),
+    }
+
 @app.get("/cwl/league-group")
-def cwl_league_group(clan_tag: str):
-    return get_league_group(clan_tag)
+async def cwl_league_group(clan_tag: str):
+    return await get_league_group_async(clan_tag)
 
 @app.get("/cwl/war-summary")
 def cwl_war_summary(clan_tag: str):
     return get_war_summary(clan_tag)
 
+def _snapshot_key(kind, clan_tag, sections):
+    return (kind, scheduler.normalize(clan_tag), tuple(sorted(sections)) if sections else None)
+
 @app.get("/cwl/full-summary")
-def cwl_full_summary(clan_tag: str):
-    return get_full_cwl_summary(clan_tag)
+async def cwl_full_summary(clan_tag: str, include: Optional[str] = None, since: Optional[str] = None):
+    # ⏱️ Clanes vigilados: resumen precargado en memoria
+    sections = _sections(include, CWL_SECTIONS) if include else None
+    summary = await scheduler.get_or_compute(clan_tag, sections)
+
+    # 🧾 ?since=<version>: solo lo que ha cambiado (time_left de las guerras abiertas siempre)
+    time_left = {
+        str(w["round"]): w.get("time_left")
+        for w in summary.get("wars") or []
+        if w.get("state") != "warEnded"
+    }
+    return snapshots.respond(
+        _snapshot_key("cwl", clan_tag, sections), summary, since, diff_cwl_summary,
+        {"time_left": time_left},
+    )
+
+@app.get("/cwl/full-summary/stream")
+async def cwl_full_summary_stream(clan_tag: str, include: Optional[str] = None):
+    # 🌊 NDJSON: cabecera, una línea por guerra según se completa, y "end"
+    sections = _sections(include, CWL_SECTIONS) if include else None
+
+    prefetched = scheduler.get_summary(clan_tag)
+    if prefetched is not None:
+        summary = prefetched if sections is None else project_cwl_summary(prefetched, sections)
+        lines = _aiter(summary_stream_lines(summary))
+    else:
+        lines = stream_full_cwl_summary_async(clan_tag, sections)
+
+    # La cabecera (grupo de liga) antes de responder: sus errores siguen siendo HTTP normales
+    header = await lines.__anext__()
+
+    async def body():
+        yield json.dumps(header, ensure_ascii=False) + "\n"
+        try:
+            async for line in lines:
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+        except Exception as e:
+            print(f"⚠️ Stream CWL de {clan_tag} cortado: {e}")
+            yield json.dumps({"type": "error", "error": "Error interno"}) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+@app.get("/cwl/live")
+async def cwl_live(clan_tag: str):
+    # 📡 SSE: "snapshot" al conectar y luego solo los cambios de la guerra
+    return StreamingResponse(
+        live_updates.sse_stream(clan_tag),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+async def _summary_or_error(clan_tag: str, sections):
+    # 📦 En un lote, el fallo de un clan no tumba al resto: se informa en línea
+    try:
+        return await scheduler.get_or_compute(clan_tag, sections)
+    except httpx.HTTPStatusError as e:
+        status = e.response.status_code
+        if status == 403:
+            message = "Clan privado o sin acceso"
+        elif status == 404:
+            message = "Clan no encontrado o sin CWL"
+        else:
+            message = f"Error de la API de Clash of Clans ({status})"
+        return {"clan_tag": clan_tag, "error": message, "status": status}
+    except CircuitOpenError as e:
+        return {"clan_tag": clan_tag, "error": str(e), "status": 503}
+    except Exception as e:
+        print(f"⚠️ Resumen CWL de {clan_tag} fallido: {e}")
+        return {"clan_tag": clan_tag, "error": "Error interno", "status": 500}
+
+@app.get("/cwl/full-summaries")
+async def cwl_full_summaries(clan_tag: List[str] = Query(...), include: Optional[str] = None):
+    sections = _sections(include, CWL_SECTIONS) if include else None
+    # Mismo clan repetido → una sola vez, respetando el orden
+    clan_tags = list(dict.fromkeys(tag.strip() for tag in clan_tag if tag.strip()))
+
+    if len(clan_tags) > BATCH_MAX_CLANS:
+        raise HTTPException(status_code=400, detail=f"Máximo {BATCH_MAX_CLANS} clanes por petición")
+
+    # Todos a la vez: grupos, guerras y warTags compartidos van por la caché / single-flight
+    results = await asyncio.gather(*(_summary_or_error(tag, sections) for tag in clan_tags))
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "summaries": dict(zip(clan_tags, results)),
+    }
+
+@app.get("/cwl/ranking-table")
+async def cwl_ranking_table(clan_tag: str, format: str = "arrow"):
+    # Sección "ranking_table" del resumen: precargada para los clanes vigilados
+    summary = await scheduler.get_or_compute(clan_tag, {"ranking_table"})
+    columns = summary.get("ranking_table") or tables.cwl_ranking_columns([], clan_tag)
+    return _table_response(columns, tables.CWL_RANKING_SCHEMA, format)
 
 @app.get("/clan/info")
-def clan_info(clan_tag: str):
-    return get_clan_info(clan_tag)
+async def clan_info(clan_tag: str):
+    return await get_clan_info_async(clan_tag)
 
 @app.get("/war/normal-summary")
-def normal_summary(clan_tag: str):
-    return get_normal_war_summary(clan_tag)
+async def normal_summary(clan_tag: str, include: Optional[str] = None, since: Optional[str] = None):
+    sections = _sections(include, NORMAL_WAR_SECTIONS)
+    summary = await get_normal_war_summary_async(clan_tag, sections)
+    return snapshots.respond(
+        _snapshot_key("normal", clan_tag, sections if include else None), summary, since, diff_normal_war,
+        {"time_left": summary.get("time_left")},
+    )
 
-@app.get("/clan/donations")
-def clan_donations(clan_tag: str):
-    return get_clan_donations(clan_tag)
+@app.get("/war/normal-probabilities")
+async def normal_probabilities(clan_tag: str):
+    return await get_normal_war_probabilities_async(clan_tag)
+
+@app.get("/war/normal-ranking-table")
+async def normal_ranking_table(clan_tag: str, format: str = "arrow"):
+    columns = await get_normal_ranking_columns_async(clan_tag)
+    return _table_response(columns, tables.NORMAL_RANKING_SCHEMA, format)
 
+@app.get("/clan/donations")
+async def clan_donations(clan_tag: str):
+    return await get_clan_donations_async(clan_tag)
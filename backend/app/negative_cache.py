@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from .config import (
+    NEGATIVE_CACHE_MAX_ENTRIES,
+    NEGATIVE_TTL_NOT_FOUND,
+    NEGATIVE_TTL_PRIVATE,
+)
+from . import cwl_calendar
+
+# =============================
+# 🚫 Caché negativa de la API
+# =============================
+# Los 404 (sin CWL, clan o guerra inexistente) y 403 (clan privado) también se
+# recuerdan, cada uno con su TTL, para no repetir la llamada en cada refresco.
+# Un "sin CWL" (404 del grupo de liga) dura hasta la próxima inscripción.
+# Los 403 por token de otra IP no cuentan: son problema nuestro, no del clan.
+
+_entries = OrderedDict()  # url → {"status", "kind", "expires_at"}
+_lock = threading.Lock()
+_stats = {
+    "hits": 0,
+    "stored": {"no_cwl": 0, "not_found": 0, "private": 0},
+}
+
+def _classify(url, status, reason):
+    if status == 404:
+        if url.endswith("/currentwar/leaguegroup"):
+            return "no_cwl", cwl_calendar.no_cwl_ttl()
+        return "not_found", NEGATIVE_TTL_NOT_FOUND
+
+    if status == 403 and reason != "accessDenied.invalidIp":
+        return "private", NEGATIVE_TTL_PRIVATE
+
+    return None, None
+
+def remember(url: str, status: int, reason=None):
+    kind, ttl = _classify(url, status, reason)
+    if kind is None:
+        return
+
+    with _lock:
+        _entries.pop(url, None)
+        _entries[url] = {
+            "status": status,
+            "kind": kind,
+            "expires_at": time.monotonic() + ttl,
+        }
+        _stats["stored"][kind] += 1
+
+        while len(_entries) > NEGATIVE_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+def get(url: str):
+    """Código de estado recordado para url (404 / 403), o None."""
+    with _lock:
+        entry = _entries.get(url)
+
+        if entry is None:
+            return None
+
+        if entry["expires_at"] <= time.monotonic():
+            del _entries[url]
+            return None
+
+        _stats["hits"] += 1
+        return entry["status"]
+
+def get_negative_cache_stats():
+    now = time.monotonic()
+
+    with _lock:
+        kinds = {"no_cwl": 0, "not_found": 0, "private": 0}
+        for entry in _entries.values():
+            if entry["expires_at"] > now:
+                kinds[entry["kind"]] += 1
+
+        return {
+            "entries": kinds,
+            "hits": _stats["hits"],
+            "stored": dict(_stats["stored"]),
+        }
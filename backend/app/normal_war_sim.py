@@ -0,0 +1,224 @@
+from functools import lru_cache
+import numpy as np
+from .config import NORMAL_WAR_SIMULATIONS, WIN_PROB_CACHE_SIZE
+
+# =============================
+# ⚔️ Probabilidad de victoria en guerra normal (Monte Carlo con targeting)
+# =============================
+# Modelo (el mismo que tenía el dashboard):
+# - cada ataque restante lo hace un TH; los TH altos atacan primero
+# - cada atacante elige la base con más estrellas extra esperadas (a igualdad,
+#   la de TH más alto); si no quedan estrellas, no ataca
+# - las estrellas salen de get_star_probs(TH atacante - TH base), con tope en lo
+#   que le quede a la base
+#
+# Las simulaciones van todas a la vez (arrays por simulación con el nº de bases
+# de cada clase) y las esperanzas y las estrellas de cada tirada están
+# precalculadas por (TH atacante, TH base, estrellas restantes / tirada).
+
+MAX_TH = 20
+
+def get_star_probs(delta):
+    """Probabilidades realistas [P0, P1, P2, P3] basadas en stats comunitarias (tunables)"""
+    if delta >= 2:
+        return [0.00, 0.00, 0.00, 1.00]
+    elif delta == 1:
+        return [0.00, 0.05, 0.10, 0.85]   # menos 3★ que antes
+    elif delta == 0:
+        return [0.10, 0.20, 0.30, 0.40]   # solo 40% 3★ en mirror (realista en guerras cerradas)
+    elif delta == -1:
+        return [0.15, 0.30, 0.40, 0.15]
+    elif delta == -2:
+        return [0.30, 0.40, 0.25, 0.05]
+    else:
+        return [0.60, 0.30, 0.09, 0.01]
+
+# Resolución del muestreo de estrellas (probabilidades en milésimas)
+_RESOLUTION = 1000
+
+def _build_tables():
+    # EXPECTED[a, b, r]: estrellas extra esperadas de un TH a contra un TH b al que le quedan r
+    # STARS[a, b, k]: estrellas del ataque de un TH a contra un TH b si sale k/_RESOLUTION
+    #   (CDF inversa: la primera s con k < P(estrellas <= s); si ninguna por redondeo, 0)
+    expected = np.zeros((MAX_TH + 1, MAX_TH + 1, 4))
+    stars = np.zeros((MAX_TH + 1, MAX_TH + 1, _RESOLUTION), dtype=np.int8)
+    draws = np.arange(_RESOLUTION)
+
+    for a in range(MAX_TH + 1):
+        for b in range(MAX_TH + 1):
+            probs = get_star_probs(a - b)
+            for rem in range(4):
+                expected[a, b, rem] = sum(min(s, rem) * p for s, p in enumerate(probs))
+
+            thresholds = np.round(np.cumsum(probs) * _RESOLUTION)
+            outcome = (draws[:, None] >= thresholds).sum(axis=1)
+            outcome[outcome == 4] = 0
+            stars[a, b] = outcome
+
+    return expected, stars
+
+EXPECTED, STARS = _build_tables()
+
+_rng = np.random.default_rng()
+_BITS = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+
+def _th(member):
+    return min(MAX_TH, max(0, member.get("townHallLevel", 12)))
+
+def _simulate_side(attacker_ths, base_ths, base_stars, simulations):
+    """Estrellas extra de cada simulación para un bando (array de tamaño simulations)."""
+    total = np.zeros(simulations, dtype=np.int64)
+    if not attacker_ths or not base_ths:
+        return total
+
+    # Las bases con el mismo (TH, estrellas restantes) son intercambiables: por
+    # simulación basta con contar cuántas hay de cada clase. Clase j*3 + (rem - 1),
+    # y una última clase "sin bases" (0 estrellas restantes) siempre disponible
+    ths = sorted(set(base_ths), reverse=True)
+    classes = len(ths) * 3
+    class_th = np.append(np.repeat(ths, 3), ths[-1])
+    class_rem = np.append(np.tile([1, 2, 3], len(ths)), 0).astype(np.int32)
+
+    initial = np.zeros(classes, dtype=np.int16)
+    for th, stars in zip(base_ths, base_stars):
+        if stars < 3:
+            initial[ths.index(th) * 3 + (2 - stars)] += 1
+
+    counts = np.tile(initial, simulations)  # plano: simulación * classes + clase
+    row_offset = np.arange(simulations) * classes
+    draws = _rng.integers(0, _RESOLUTION, (len(attacker_ths), simulations), dtype=np.int16)
+    attackers = sorted(attacker_ths, reverse=True)
+    step = 0
+
+    # Los atacantes del mismo TH comparten preferencia y tabla de estrellas: todo lo
+    # que depende del TH se calcula una vez por grupo y cada paso son solo gathers
+    for att_th in sorted(set(attackers), reverse=True):
+        # Preferencia fija para este TH: más estrellas esperadas primero (a igualdad,
+        # la base de TH más alto). Por simulación, un bit por clase con bases en
+        # ese orden (+ el de "sin bases", el último): la elegida es el bit más bajo
+        expected = EXPECTED[att_th, class_th[:classes], class_rem[:classes]]
+        order = np.append(np.lexsort((-class_th[:classes], -expected)), classes)
+        rank = np.argsort(order)
+        available = counts.reshape(simulations, classes)[:, order[:classes]] > 0
+        mask = (available * _BITS[:classes]).sum(axis=1, dtype=np.uint64) | _BITS[classes]
+
+        # Estrellas extra (ya con el tope de la base) por posición en la preferencia:
+        # posición * _RESOLUTION + tirada
+        gains = np.minimum(STARS[att_th, class_th], class_rem[:, None])[order].ravel()
+        rem_by_pick = class_rem[order]
+
+        for _ in range(attackers.count(att_th)):
+            lowest = mask & (~mask + np.uint64(1))
+            pick = np.frexp(lowest.astype(np.float64))[1] - 1
+
+            add = gains.take(pick * _RESOLUTION + draws[step])
+            total += add
+            step += 1
+
+            # La base pasa a la clase con menos estrellas restantes (o se agota)
+            moved = add.nonzero()[0]
+            moved_pick = pick[moved]
+            moved_add = add[moved]
+            best = order.take(moved_pick)
+            source = row_offset[moved] + best
+            counts[source] -= 1
+            emptied = counts[source] == 0
+            mask[moved[emptied]] &= ~_BITS[moved_pick[emptied]]
+
+            open_ = moved_add < rem_by_pick.take(moved_pick)
+            target = best[open_] - moved_add[open_]
+            target_index = source[open_] - moved_add[open_]
+            counts[target_index] += 1
+            filled = counts[target_index] == 1
+            mask[moved[open_][filled]] |= _BITS[rank[target[filled]]]
+
+    return total
+
+@lru_cache(maxsize=WIN_PROB_CACHE_SIZE)
+def _cached_probs(my_stars, opp_stars, my_attackers, opp_attackers,
+                  opp_base_ths, opp_base_stars, my_base_ths, my_base_stars, simulations):
+    my_final = my_stars + _simulate_side(my_attackers, opp_base_ths, opp_base_stars, simulations)
+    opp_final = opp_stars + _simulate_side(opp_attackers, my_base_ths, my_base_stars, simulations)
+
+    wins = int(np.count_nonzero(my_final > opp_final))
+    losses = int(np.count_nonzero(my_final < opp_final))
+    draws = simulations - wins - losses
+
+    return {
+        "status": "open_war",
+        "win_probability": round(wins / simulations * 100, 1),
+        "lose_probability": round(losses / simulations * 100, 1),
+        "draw_probability": round(draws / simulations * 100, 1),
+    }
+
+def _remaining_attackers(members, attacks_per_member):
+    # Un TH por ataque que le queda a cada miembro
+    attackers = []
+    for member in members:
+        left = max(0, attacks_per_member - len(member.get("attacks", [])))
+        attackers.extend([_th(member)] * left)
+    return tuple(attackers)
+
+def _bases(defenders, attackers):
+    # (TH, estrellas) de cada base defensora: cuenta el mejor ataque recibido
+    best = {}
+    for member in attackers:
+        for attack in member.get("attacks", []):
+            tag = attack.get("defenderTag")
+            best[tag] = max(best.get(tag, 0), attack.get("stars", 0))
+
+    return (
+        tuple(_th(m) for m in defenders),
+        tuple(min(3, best.get(m.get("tag"), 0)) for m in defenders),
+    )
+
+def estimate_normal_war_probs(war, clan_tag: str, simulations=None):
+    """
+    % victoria / empate / derrota de una guerra normal (estrellas; no desempata por destrucción).
+    Misma forma que win_state en CWL: status + *_probability.
+    """
+    state = (war or {}).get("state")
+
+    if state in (None, "notInWar", "preparation"):
+        return {"status": "not_started"}
+
+    if war["clan"].get("tag") == clan_tag:
+        me, opp = war["clan"], war["opponent"]
+    else:
+        me, opp = war["opponent"], war["clan"]
+
+    my_stars = me.get("stars", 0)
+    opp_stars = opp.get("stars", 0)
+
+    if state == "warEnded":
+        if my_stars > opp_stars:
+            return {"status": "final_win", "result_text": "Victoria"}
+        elif my_stars < opp_stars:
+            return {"status": "final_loss", "result_text": "Derrota"}
+        return {"status": "final_draw", "result_text": "Empate"}
+
+    attacks_per_member = war.get("attacksPerMember", 2)
+    opp_base_ths, opp_base_stars = _bases(opp.get("members", []), me.get("members", []))
+    my_base_ths, my_base_stars = _bases(me.get("members", []), opp.get("members", []))
+
+    # 🧠 Memoizado por estado: mientras nadie ataque, es una consulta al LRU
+    result = _cached_probs(
+        my_stars, opp_stars,
+        _remaining_attackers(me.get("members", []), attacks_per_member),
+        _remaining_attackers(opp.get("members", []), attacks_per_member),
+        opp_base_ths, opp_base_stars,
+        my_base_ths, my_base_stars,
+        simulations or NORMAL_WAR_SIMULATIONS,
+    )
+    return dict(result)
+
+def get_normal_war_sim_stats():
+    info = _cached_probs.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "entries": info.currsize,
+        "max_entries": info.maxsize,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_ratio": round(info.hits / lookups, 3) if lookups else 0.0,
+    }
@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from .config import (
+    RATE_LIMIT_PER_SECOND,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_MIN_PER_SECOND,
+    RATE_LIMIT_DEFAULT_BACKOFF,
+)
+
+# =============================
+# 🚦 Limitador de peticiones hacia la API (token bucket + prioridades)
+# =============================
+# Todas las llamadas a la API (cliente sync y async) pasan por aquí.
+# El ritmo y la ráfaga configurados son por token; el total escala con los tokens sanos.
+# Cuando no hay tokens, las peticiones esperan en una cola ordenada por prioridad:
+# la guerra en curso va antes que el scouting y que rellenar rondas ya terminadas.
+
+PRIORITY_LIVE = 0       # ronda inWar / currentwar
+PRIORITY_NORMAL = 1     # grupo de liga, rondas aún desconocidas
+PRIORITY_SCOUTING = 2   # /clan/info
+PRIORITY_BACKFILL = 3   # rondas ya finalizadas
+
+_PRIORITY_NAMES = {
+    PRIORITY_LIVE: "live",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_SCOUTING: "scouting",
+    PRIORITY_BACKFILL: "backfill",
+}
+
+# Cada cuánto revisa su turno una petición en espera (segundos)
+_POLL_INTERVAL = 0.02
+
+_lock = threading.Lock()
+_capacity = 1  # nº de tokens sanos
+_seq = itertools.count()
+_waiters = []  # heap de (prioridad, nº de llegada)
+_tokens = float(RATE_LIMIT_BURST)
+_last_refill = time.monotonic()
+_rate = float(RATE_LIMIT_PER_SECOND)
+_paused_until = 0.0
+_stats = {
+    "granted": {name: 0 for name in _PRIORITY_NAMES.values()},
+    "throttled": 0,
+    "waited_seconds": 0.0,
+}
+
+def _refill(now):
+    global _tokens, _last_refill
+    _tokens = min(float(RATE_LIMIT_BURST * _capacity), _tokens + max(0.0, now - _last_refill) * _rate)
+    _last_refill = max(_last_refill, now)
+
+def _try_acquire(ticket) -> float:
+    """Con el lock cogido. Devuelve 0 si se concede el token o los segundos a esperar."""
+    global _tokens
+
+    now = time.monotonic()
+    if now < _paused_until:
+        return _paused_until - now
+
+    _refill(now)
+
+    # Solo la petición más prioritaria de la cola puede coger el token
+    if _waiters[0] != ticket:
+        return _POLL_INTERVAL
+
+    if _tokens >= 1:
+        _tokens -= 1
+        heapq.heappop(_waiters)
+        _stats["granted"][_PRIORITY_NAMES.get(ticket[0], "normal")] += 1
+        return 0.0
+
+    return (1 - _tokens) / _rate
+
+def _enqueue(priority):
+    ticket = (priority, next(_seq))
+    with _lock:
+        heapq.heappush(_waiters, ticket)
+    return ticket
+
+def _dequeue(ticket, waited):
+    with _lock:
+        if ticket in _waiters:
+            _waiters.remove(ticket)
+            heapq.heapify(_waiters)
+        _stats["waited_seconds"] += waited
+
+def acquire(priority: int = PRIORITY_NORMAL):
+    ticket = _enqueue(priority)
+    start = time.monotonic()
+
+    try:
+        while True:
+            with _lock:
+                wait = _try_acquire(ticket)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, _POLL_INTERVAL))
+    finally:
+        _dequeue(ticket, time.monotonic() - start)
+
+async def acquire_async(priority: int = PRIORITY_NORMAL):
+    ticket = _enqueue(priority)
+    start = time.monotonic()
+
+    try:
+        while True:
+            with _lock:
+                wait = _try_acquire(ticket)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, _POLL_INTERVAL))
+    finally:
+        _dequeue(ticket, time.monotonic() - start)
+
+def try_acquire() -> bool:
+    """Token sin esperar, solo si no hay nadie en cola (p. ej. peticiones de respaldo)."""
+    global _tokens
+
+    with _lock:
+        now = time.monotonic()
+        if now < _paused_until or _waiters:
+            return False
+
+        _refill(now)
+        if _tokens < 1:
+            return False
+
+        _tokens -= 1
+        return True
+
+# =============================
+# 🐢 Frenado adaptativo
+# =============================
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+def report_throttled(retry_after=None):
+    """El upstream respondió 429: pausa hasta Retry-After y baja el ritmo a la mitad."""
+    global _rate, _tokens, _paused_until, _last_refill
+
+    pause = retry_after if retry_after is not None else RATE_LIMIT_DEFAULT_BACKOFF
+
+    with _lock:
+        _rate = max(float(RATE_LIMIT_MIN_PER_SECOND * _capacity), _rate / 2)
+        _tokens = 0.0
+        _paused_until = max(_paused_until, time.monotonic() + pause)
+        # Durante la pausa no se acumulan tokens
+        _last_refill = _paused_until
+        _stats["throttled"] += 1
+
+def report_success():
+    """Recuperación gradual del ritmo configurado tras un frenado."""
+    global _rate
+
+    with _lock:
+        configured = RATE_LIMIT_PER_SECOND * _capacity
+        if _rate < configured:
+            _rate = min(float(configured), _rate + configured * 0.05)
+
+def set_capacity(healthy_tokens: int):
+    """Reescala el ritmo al nº de tokens sanos (manteniendo un frenado en curso)."""
+    global _capacity, _rate
+
+    with _lock:
+        if healthy_tokens == _capacity:
+            return
+        _rate = _rate * healthy_tokens / _capacity
+        _capacity = healthy_tokens
+
+def get_rate_limiter_stats():
+    with _lock:
+        now = time.monotonic()
+        return {
+            "rate_per_second": round(_rate, 2),
+            "configured_rate_per_second": RATE_LIMIT_PER_SECOND * _capacity,
+            "burst": RATE_LIMIT_BURST * _capacity,
+            "capacity_tokens": _capacity,
+            "tokens": round(_tokens, 2),
+            "waiting": len(_waiters),
+            "paused_seconds": round(max(0.0, _paused_until - now), 2),
+            "granted": dict(_stats["granted"]),
+            "throttled": _stats["throttled"],
+            "waited_seconds": round(_stats["waited_seconds"], 2),
+        }
@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+from collections import deque
+from .config import (
+    HTTP_RETRY_MAX,
+    HTTP_RETRY_BASE_DELAY,
+    HTTP_RETRY_MAX_DELAY,
+    HEDGE_ENABLED,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_MIN_DELAY,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_COOLDOWN,
+)
+
+# =============================
+# 🛡️ Latencia de cola hacia la API
+# =============================
+# - Reintentos acotados con jitter (solo GET, idempotentes)
+# - Peticiones "hedged": si una llamada tarda más que su p95, se lanza otra igual
+#   y se usa la primera que responda
+# - Circuit breaker: con la API caída se deja de llamar durante un rato y se sirve
+#   lo último cacheado (o se falla rápido)
+
+RETRYABLE_STATUS = (500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """La API está degradada y no hay copia cacheada que servir."""
+
+
+_lock = threading.Lock()
+_latencies = {}  # tipo de endpoint → últimas latencias (segundos)
+_breaker = {
+    "state": "closed",          # closed / open / half_open
+    "consecutive_failures": 0,
+    "opened_at": 0.0,
+    "trial_started": 0.0,
+}
+_stats = {
+    "retries": 0,
+    "hedges": 0,
+    "hedges_won": 0,
+    "breaker_opened": 0,
+    "short_circuited": 0,
+    "stale_served": 0,
+}
+
+def count(key: str):
+    with _lock:
+        _stats[key] += 1
+
+def endpoint_kind(url: str) -> str:
+    if "/clanwarleagues/wars/" in url:
+        return "war"
+    if url.endswith("/currentwar/leaguegroup"):
+        return "league_group"
+    if url.endswith("/currentwar"):
+        return "current_war"
+    return "clan"
+
+# =============================
+# 🔁 Reintentos
+# =============================
+def retry_delay(attempt: int) -> float:
+    """Backoff exponencial con jitter completo."""
+    cap = min(HTTP_RETRY_MAX_DELAY, HTTP_RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(0, cap)
+
+def should_retry(attempt: int, deadline: float) -> bool:
+    return attempt < HTTP_RETRY_MAX and time.monotonic() < deadline
+
+# =============================
+# 🐇 Hedging
+# =============================
+def record_latency(kind: str, seconds: float):
+    with _lock:
+        samples = _latencies.setdefault(kind, deque(maxlen=200))
+        samples.append(seconds)
+
+def _p95(samples):
+    ordered = sorted(samples)
+    return ordered[int(0.95 * (len(ordered) - 1))]
+
+def hedge_delay(kind: str):
+    """Segundos a esperar antes de lanzar la petición de respaldo (None = sin hedging)."""
+    if not HEDGE_ENABLED:
+        return None
+
+    with _lock:
+        samples = _latencies.get(kind)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY, _p95(samples))
+
+# =============================
+# ⚡ Circuit breaker
+# =============================
+def allow_request() -> bool:
+    now = time.monotonic()
+
+    with _lock:
+        state = _breaker["state"]
+
+        if state == "closed":
+            return True
+
+        if state == "open" and now - _breaker["opened_at"] >= BREAKER_COOLDOWN:
+            # Media apertura: una sola petición de prueba
+            _breaker["state"] = "half_open"
+            _breaker["trial_started"] = now
+            return True
+
+        if state == "half_open" and now - _breaker["trial_started"] >= BREAKER_COOLDOWN:
+            # La prueba anterior nunca informó: se permite otra
+            _breaker["trial_started"] = now
+            return True
+
+        _stats["short_circuited"] += 1
+        return False
+
+def record_success():
+    with _lock:
+        _breaker["state"] = "closed"
+        _breaker["consecutive_failures"] = 0
+
+def record_failure():
+    with _lock:
+        _breaker["consecutive_failures"] += 1
+
+        if _breaker["state"] == "half_open" or (
+            _breaker["state"] == "closed"
+            and _breaker["consecutive_failures"] >= BREAKER_FAILURE_THRESHOLD
+        ):
+            _breaker["state"] = "open"
+            _breaker["opened_at"] = time.monotonic()
+            _stats["breaker_opened"] += 1
+            print("⚠️ API de Clash of Clans degradada: circuit breaker abierto")
+
+def get_resilience_stats():
+    now = time.monotonic()
+
+    with _lock:
+        return {
+            "breaker": {
+                "state": _breaker["state"],
+                "consecutive_failures": _breaker["consecutive_failures"],
+                "open_seconds": round(now - _breaker["opened_at"], 1) if _breaker["state"] != "closed" else 0.0,
+            },
+            **_stats,
+            "p95_ms": {
+                kind: round(_p95(samples) * 1000, 1)
+                for kind, samples in _latencies.items()
+                if samples
+            },
+        }
@@ -0,0 +1,155 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from .config import (
+    CACHE_MAX_ENTRIES,
+    CACHE_MAX_BYTES,
+    CACHE_TTL_IN_WAR,
+    CACHE_TTL_PREPARATION,
+    CACHE_TTL_WAR_ENDED,
+    CACHE_TTL_DEFAULT,
+)
+
+# =============================
+# 🧠 Caché de respuestas de la API (TTL según estado + LRU)
+# =============================
+# Clave: URL de la API. Valor: JSON ya parseado.
+# ⚠️ Los objetos cacheados se comparten entre peticiones: tratarlos como solo lectura.
+# Las entradas caducadas no se borran al instante: quedan como copia "stale" para
+# servirla si la API está caída (get_stale), hasta que las expulse el LRU.
+
+_entries = OrderedDict()  # url → {"value", "expires_at", "size"}
+_lock = threading.Lock()
+_total_bytes = 0
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "expired": 0,
+    "evictions": 0,
+}
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+def _parse_coc_time(value):
+    if not value:
+        return None
+    try:
+        dt = datetime.strptime(value, "%Y%m%dT%H%M%S.000Z")
+    except (TypeError, ValueError):
+        return None
+    return dt.replace(tzinfo=timezone.utc)
+
+def _parse_max_age(cache_control):
+    if not cache_control:
+        return None
+    match = _MAX_AGE_RE.search(cache_control)
+    return int(match.group(1)) if match else None
+
+def ttl_for(payload, cache_control=None) -> float:
+    """
+    TTL (segundos) para una respuesta de la API:
+    - Cache-Control: max-age del upstream, si viene
+    - si no, según el estado de la guerra (inWar corto, preparation largo)
+    - y nunca más allá del próximo cambio de estado conocido (startTime / endTime)
+    """
+    state = payload.get("state") if isinstance(payload, dict) else None
+
+    ttl = _parse_max_age(cache_control)
+    if ttl is None:
+        if state == "inWar":
+            ttl = CACHE_TTL_IN_WAR
+        elif state == "preparation":
+            ttl = CACHE_TTL_PREPARATION
+        elif state == "warEnded":
+            ttl = CACHE_TTL_WAR_ENDED
+        else:
+            ttl = CACHE_TTL_DEFAULT
+
+    # ⏰ Expiración anclada al cambio de fase
+    if state == "preparation":
+        boundary = _parse_coc_time(payload.get("startTime"))
+    elif state == "inWar":
+        boundary = _parse_coc_time(payload.get("endTime"))
+    else:
+        boundary = None
+
+    if boundary is not None:
+        until_boundary = (boundary - datetime.now(timezone.utc)).total_seconds()
+        ttl = min(ttl, max(0.0, until_boundary))
+
+    return ttl
+
+def _drop(url):
+    global _total_bytes
+    entry = _entries.pop(url)
+    _total_bytes -= entry["size"]
+
+def get(url: str):
+    with _lock:
+        entry = _entries.get(url)
+
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+
+        if entry["expires_at"] <= time.monotonic():
+            _stats["expired"] += 1
+            _stats["misses"] += 1
+            return None
+
+        _entries.move_to_end(url)
+        _stats["hits"] += 1
+        return entry["value"]
+
+def get_stale(url: str):
+    """Último valor conocido de url, aunque haya caducado (None si no hay)."""
+    with _lock:
+        entry = _entries.get(url)
+        return entry["value"] if entry else None
+
+def put(url: str, value, ttl: float, size: int):
+    global _total_bytes
+
+    # 🛑 No cabe
+    if size > CACHE_MAX_BYTES:
+        return
+
+    ttl = max(0.0, ttl)
+
+    with _lock:
+        if url in _entries:
+            _drop(url)
+
+        _entries[url] = {
+            "value": value,
+            "expires_at": time.monotonic() + ttl,
+            "size": size,
+        }
+        _total_bytes += size
+
+        # LRU: fuera lo menos usado hasta volver a los límites
+        while len(_entries) > CACHE_MAX_ENTRIES or _total_bytes > CACHE_MAX_BYTES:
+            oldest = next(iter(_entries))
+            _drop(oldest)
+            _stats["evictions"] += 1
+
+def clear():
+    global _total_bytes
+
+    with _lock:
+        _entries.clear()
+        _total_bytes = 0
+
+def get_cache_stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "entries": len(_entries),
+            "bytes": _total_bytes,
+            "max_entries": CACHE_MAX_ENTRIES,
+            "max_bytes": CACHE_MAX_BYTES,
+            **_stats,
+            "hit_ratio": round(_stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
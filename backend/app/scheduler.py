@@ -0,0 +1,265 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from .config import (
+    WATCHLIST_CLAN_TAGS,
+    SCHEDULER_ENABLED,
+    SCHEDULER_TICK,
+    SCHEDULER_CONCURRENCY,
+    SCHEDULER_URGENT_WINDOW,
+    SCHEDULER_INTERVAL_URGENT,
+    SCHEDULER_INTERVAL_IN_WAR,
+    SCHEDULER_INTERVAL_PREPARATION,
+    SCHEDULER_INTERVAL_IDLE,
+    SCHEDULER_INTERVAL_ERROR,
+    LIVE_REFRESH_INTERVAL,
+)
+from . import cwl_calendar
+from .cwl_logic import CWL_SECTIONS, get_full_cwl_summary_async, project_cwl_summary
+
+# =============================
+# ⏱️ Precarga en segundo plano de los clanes vigilados
+# =============================
+# Una tarea asyncio (arrancada en el lifespan de la app) mantiene en memoria el
+# resumen CWL de cada clan de WATCHLIST_CLAN_TAGS. El ritmo de refresco sigue la
+# urgencia: guerra inWar cerca del final muy a menudo, preparation poco, y una
+# temporada terminada (o sin CWL) prácticamente nunca.
+#
+# Las rutas piden get_or_compute(): si hay un resumen al día se sirve sin tocar
+# la API; si no, se calcula y se guarda con remember().
+#
+# Los clanes con espectadores en vivo (watch / unwatch) se vigilan también mientras
+# dure la conexión, y cada resumen nuevo se pasa a los listeners (live_updates).
+
+_lock = threading.Lock()
+_summaries = {}  # clan_tag → {"summary", "refreshed_at", "next_refresh", "interval", "urgency"}
+_viewers = {}    # clan_tag → nº de conexiones en vivo
+_listeners = []  # fn(clan_tag, summary) tras cada resumen nuevo
+_task = None
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "refreshes": 0,
+    "errors": 0,
+}
+
+def normalize(clan_tag: str) -> str:
+    return clan_tag.strip().upper()
+
+def _watched():
+    with _lock:
+        return list(dict.fromkeys([*WATCHLIST_CLAN_TAGS, *_viewers]))
+
+def watch(clan_tag: str):
+    clan_tag = normalize(clan_tag)
+    with _lock:
+        _viewers[clan_tag] = _viewers.get(clan_tag, 0) + 1
+
+def unwatch(clan_tag: str):
+    clan_tag = normalize(clan_tag)
+    with _lock:
+        remaining = _viewers.get(clan_tag, 0) - 1
+        if remaining > 0:
+            _viewers[clan_tag] = remaining
+            return
+
+        _viewers.pop(clan_tag, None)
+        if clan_tag not in WATCHLIST_CLAN_TAGS:
+            _summaries.pop(clan_tag, None)
+
+def add_listener(fn):
+    _listeners.append(fn)
+
+def _seconds_until(coc_time):
+    if not coc_time:
+        return None
+    try:
+        dt = datetime.strptime(coc_time, "%Y%m%dT%H%M%S.000Z").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+    return (dt - datetime.now(timezone.utc)).total_seconds()
+
+def refresh_plan(summary):
+    """(urgencia, segundos hasta el próximo refresco) para un resumen CWL."""
+    wars = summary.get("wars") or []
+    states = {w.get("state") for w in wars}
+
+    if "inWar" in states:
+        left = [
+            s for s in (_seconds_until(w.get("end_time")) for w in wars if w.get("state") == "inWar")
+            if s is not None
+        ]
+        if left and min(left) <= SCHEDULER_URGENT_WINDOW:
+            # Recta final: refresco frecuente y, como muy tarde, justo al acabar
+            return "urgent", max(1.0, min(SCHEDULER_INTERVAL_URGENT, min(left) + 1))
+        return "in_war", SCHEDULER_INTERVAL_IN_WAR
+
+    if "preparation" in states:
+        return "preparation", SCHEDULER_INTERVAL_PREPARATION
+
+    # Temporada terminada o sin CWL: hasta la próxima inscripción (o a menudo durante ella)
+    return "idle", min(SCHEDULER_INTERVAL_IDLE, cwl_calendar.no_cwl_ttl())
+
+def remember(clan_tag: str, summary):
+    """Guarda un resumen recién calculado (solo para clanes vigilados)."""
+    clan_tag = normalize(clan_tag)
+    if clan_tag not in WATCHLIST_CLAN_TAGS and clan_tag not in _viewers:
+        return
+
+    urgency, interval = refresh_plan(summary)
+    now = time.monotonic()
+
+    with _lock:
+        # 📡 Con espectadores en vivo, la guerra en curso se sigue más de cerca
+        if clan_tag in _viewers and urgency in ("urgent", "in_war"):
+            interval = min(interval, LIVE_REFRESH_INTERVAL)
+
+        _summaries[clan_tag] = {
+            "summary": summary,
+            "refreshed_at": now,
+            "next_refresh": now + interval,
+            "interval": interval,
+            "urgency": urgency,
+        }
+
+    for listener in _listeners:
+        try:
+            listener(clan_tag, summary)
+        except Exception as e:
+            print(f"⚠️ Listener de {clan_tag} fallido: {e}")
+
+def get_summary(clan_tag: str):
+    """Resumen precargado y al día, o None."""
+    clan_tag = normalize(clan_tag)
+    now = time.monotonic()
+
+    with _lock:
+        entry = _summaries.get(clan_tag)
+
+        # Margen de un par de ciclos por si el planificador va algo retrasado.
+        # Sin resumen (primer refresco fallido) también es un fallo, no un acierto
+        if entry is None or entry["summary"] is None or now > entry["next_refresh"] + 2 * SCHEDULER_TICK:
+            _stats["misses"] += 1
+            return None
+
+        _stats["hits"] += 1
+        return entry["summary"]
+
+async def get_or_compute(clan_tag: str, sections=None):
+    """
+    Resumen CWL del clan: el precargado (recortado a sections) si está al día; si no,
+    se calcula solo lo pedido. Únicamente los resúmenes completos se guardan.
+    """
+    # Mismo tag con el que se guarda: " #2r9..." calculado tal cual no encontraría sus guerras
+    clan_tag = normalize(clan_tag)
+
+    summary = get_summary(clan_tag)
+    if summary is not None:
+        return summary if sections is None else project_cwl_summary(summary, sections)
+
+    summary = await get_full_cwl_summary_async(clan_tag, sections)
+    if sections is None or sections >= set(CWL_SECTIONS):
+        remember(clan_tag, summary)
+    return summary
+
+def _due(now):
+    watched = _watched()
+
+    with _lock:
+        due = [
+            tag for tag in watched
+            if tag not in _summaries or _summaries[tag]["next_refresh"] <= now
+        ]
+        # Lo más atrasado primero
+        return sorted(due, key=lambda tag: _summaries[tag]["next_refresh"] if tag in _summaries else 0.0)
+
+async def _refresh(clan_tag, semaphore):
+    async with semaphore:
+        try:
+            summary = await get_full_cwl_summary_async(clan_tag)
+        except Exception as e:
+            print(f"⚠️ Precarga de {clan_tag} fallida: {e}")
+            with _lock:
+                _stats["errors"] += 1
+                entry = _summaries.get(clan_tag)
+                retry_at = time.monotonic() + SCHEDULER_INTERVAL_ERROR
+                if entry is not None:
+                    entry["next_refresh"] = retry_at
+                else:
+                    _summaries[clan_tag] = {
+                        "summary": None,
+                        "refreshed_at": None,
+                        "next_refresh": retry_at,
+                        "interval": SCHEDULER_INTERVAL_ERROR,
+                        "urgency": "error",
+                    }
+            return
+
+        remember(clan_tag, summary)
+        with _lock:
+            _stats["refreshes"] += 1
+
+async def _run():
+    semaphore = asyncio.Semaphore(SCHEDULER_CONCURRENCY)
+    in_flight = {}  # clan_tag → task
+
+    try:
+        while True:
+            for tag in _due(time.monotonic()):
+                if tag not in in_flight:
+                    in_flight[tag] = asyncio.create_task(_refresh(tag, semaphore))
+
+            await asyncio.sleep(SCHEDULER_TICK)
+
+            for tag, task in list(in_flight.items()):
+                if task.done():
+                    del in_flight[tag]
+    finally:
+        for task in in_flight.values():
+            task.cancel()
+
+def start():
+    global _task
+
+    # Aunque la lista esté vacía: los espectadores en vivo también añaden clanes
+    if not SCHEDULER_ENABLED or _task is not None:
+        return
+
+    _task = asyncio.create_task(_run())
+    print(f"⏱️ Precarga activa para {len(WATCHLIST_CLAN_TAGS)} clanes")
+
+async def stop():
+    global _task
+
+    if _task is None:
+        return
+
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+
+def get_scheduler_stats():
+    now = time.monotonic()
+
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "enabled": SCHEDULER_ENABLED,
+            "running": _task is not None and not _task.done(),
+            "watchlist": len(WATCHLIST_CLAN_TAGS),
+            "live_clans": len(_viewers),
+            **_stats,
+            "hit_ratio": round(_stats["hits"] / lookups, 3) if lookups else 0.0,
+            "clans": {
+                tag: {
+                    "urgency": entry["urgency"],
+                    "age_seconds": round(now - entry["refreshed_at"], 1) if entry["refreshed_at"] is not None else None,
+                    "next_refresh_seconds": round(max(0.0, entry["next_refresh"] - now), 1),
+                }
+                for tag, entry in _summaries.items()
+            },
+        }
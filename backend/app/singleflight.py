@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+# =============================
+# 🛫 Single-flight: una sola petición en vuelo por clave
+# =============================
+# Si varios dashboards piden a la vez el mismo grupo / warTag / clan / guerra,
+# solo el primero llama a la API; el resto espera y recibe el mismo resultado
+# (o la misma excepción).
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}
+_async_calls = {}
+_lock = threading.Lock()
+_stats = {
+    "leaders": 0,
+    "deduplicated": 0,
+}
+
+def do(key, fn):
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+
+        if leader:
+            call = _Call()
+            _calls[key] = call
+            _stats["leaders"] += 1
+        else:
+            _stats["deduplicated"] += 1
+
+    if not leader:
+        call.event.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = fn()
+        return call.result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            _calls.pop(key, None)
+        call.event.set()
+
+async def do_async(key, coro_fn):
+    task = _async_calls.get(key)
+
+    if task is None:
+        # La petición va en su propia tarea: si se cancela quien la lanzó, sigue
+        # para los demás que esperan el mismo resultado
+        task = asyncio.ensure_future(coro_fn())
+        _async_calls[key] = task
+        task.add_done_callback(lambda t: _finished(key, t))
+        with _lock:
+            _stats["leaders"] += 1
+    else:
+        with _lock:
+            _stats["deduplicated"] += 1
+
+    # shield: cancelar a un llamador (líder incluido) no cancela la petición compartida
+    return await asyncio.shield(task)
+
+def _finished(key, task):
+    if _async_calls.get(key) is task:
+        _async_calls.pop(key)
+    # Marcamos la excepción como recogida aunque no quede nadie esperando
+    if not task.cancelled():
+        task.exception()
+
+def get_singleflight_stats():
+    with _lock:
+        return {
+            "in_flight": len(_calls) + len(_async_calls),
+            **_stats,
+        }
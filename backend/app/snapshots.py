@@ -0,0 +1,86 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from .config import SNAPSHOT_HISTORY, SNAPSHOT_MAX_KEYS
+
+# =============================
+# 🧾 Versiones de los resúmenes y respuestas delta (?since=)
+# =============================
+# Cada resumen servido (clan + endpoint + secciones) lleva un "version". La versión
+# solo sube cuando el contenido cambia de verdad (según la función diff): el ruido
+# del Monte Carlo o time_left no cuentan. Con ?since=<version> el cliente recibe:
+# - "not_modified" si sigue al día
+# - solo los cambios desde su versión, si aún la tenemos guardada
+# - el resumen completo si no (versión demasiado vieja, reinicio, otra guerra...)
+#
+# Las versiones llevan el instante de arranque: tras un reinicio no se confunden.
+
+_boot = format(int(time.time()), "x")
+_seq = itertools.count(1)
+_entries = OrderedDict()  # key → OrderedDict(version → resumen)
+_lock = threading.Lock()
+_stats = {
+    "full": 0,
+    "deltas": 0,
+    "not_modified": 0,
+}
+
+def _record(key, summary, diff):
+    """Versión actual de summary (nueva solo si cambió respecto a la última guardada)."""
+    with _lock:
+        versions = _entries.get(key)
+        if versions is not None:
+            _entries.move_to_end(key)
+            latest_version, latest = next(reversed(versions.items()))
+        else:
+            latest = None
+
+    if latest is not None and diff(latest, summary) == {}:
+        return latest_version
+
+    version = f"{_boot}-{next(_seq)}"
+
+    with _lock:
+        versions = _entries.setdefault(key, OrderedDict())
+        versions[version] = summary
+
+        while len(versions) > SNAPSHOT_HISTORY:
+            versions.popitem(last=False)
+        while len(_entries) > SNAPSHOT_MAX_KEYS:
+            _entries.popitem(last=False)
+
+    return version
+
+def _base(key, version):
+    with _lock:
+        return (_entries.get(key) or {}).get(version)
+
+def respond(key, summary, since, diff, extra=None):
+    """
+    Respuesta para un resumen recién calculado.
+    diff(old, new) → dict de cambios ({} = nada) o None si hay que mandarlo entero.
+    extra: campos que siempre acompañan a un delta (p. ej. time_left).
+    """
+    version = _record(key, summary, diff)
+    base = _base(key, since) if since else None
+    changes = diff(base, summary) if base is not None else None
+
+    if changes is None:
+        _stats["full"] += 1
+        return {**summary, "version": version}
+
+    if not changes:
+        _stats["not_modified"] += 1
+        return {"version": version, "since": since, "not_modified": True, **(extra or {})}
+
+    _stats["deltas"] += 1
+    return {"version": version, "since": since, "delta": True, "changes": changes, **(extra or {})}
+
+def get_snapshot_stats():
+    with _lock:
+        return {
+            "keys": len(_entries),
+            "versions": sum(len(v) for v in _entries.values()),
+            **_stats,
+        }
@@ -0,0 +1,97 @@
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pyarrow es opcional: sin él, solo format=json
+    pa = None
+
+# =============================
+# 📊 Tablas de ranking tipadas (Arrow IPC / JSON columnar)
+# =============================
+# Las mismas filas que get_attack_ranking_data(_normal), pero como columnas de
+# números y booleanos: sin "87.00%" ni estrellas en emoji. El formato visual se
+# aplica solo al pintar. Con pyarrow se sirve como stream Arrow IPC, que el
+# frontend convierte en DataFrame sin reparsear nada. Las de CWL van además en
+# la sección "ranking_table" del resumen (y así en el lote y en la precarga).
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# (columna, tipo Arrow)
+CWL_RANKING_SCHEMA = (
+    ("round", "int8"),
+    ("tag", "string"),
+    ("name", "string"),
+    ("map_position", "int16"),
+    ("attacked", "bool_"),
+    ("attacks", "int8"),
+    ("stars", "int8"),
+    ("destruction", "float32"),
+)
+NORMAL_RANKING_SCHEMA = CWL_RANKING_SCHEMA[1:]
+
+def arrow_available() -> bool:
+    return pa is not None
+
+def _my_side(war, clan_tag):
+    clan_data = war.get("clan") or {}
+    opp_data = war.get("opponent") or {}
+
+    # 🛑 Sin tags: guerra en preparación o incompleta
+    if not clan_data.get("tag") or not opp_data.get("tag"):
+        return None
+
+    return clan_data if clan_data.get("tag") == clan_tag else opp_data
+
+def _empty(schema):
+    return {name: [] for name, _ in schema}
+
+def _append_members(columns, me, max_attacks, round_idx=None):
+    for m in me.get("members", []):
+        attacks = m.get("attacks", [])[:max_attacks]
+
+        if round_idx is not None:
+            columns["round"].append(round_idx)
+        columns["tag"].append(m.get("tag"))
+        columns["name"].append(m["name"])
+        columns["map_position"].append(m["mapPosition"])
+        columns["attacked"].append(bool(attacks))
+        columns["attacks"].append(len(attacks))
+        columns["stars"].append(sum(a.get("stars", 0) for a in attacks))
+        columns["destruction"].append(float(sum(a.get("destructionPercentage", 0) for a in attacks)))
+
+def _sorted(columns, key_names):
+    # Orden de las filas: por las claves dadas (descendente en estrellas / destrucción)
+    n = len(columns["name"])
+    order = sorted(range(n), key=lambda i: tuple(columns[k][i] * s for k, s in key_names))
+    return {name: [values[i] for i in order] for name, values in columns.items()}
+
+def cwl_ranking_columns(wars, clan_tag):
+    """wars: [(war, round_idx)] → columnas de CWL_RANKING_SCHEMA (un ataque por jugador)."""
+    columns = _empty(CWL_RANKING_SCHEMA)
+
+    for war, round_idx in wars:
+        me = _my_side(war, clan_tag)
+        if me is not None:
+            _append_members(columns, me, max_attacks=1, round_idx=round_idx)
+
+    return _sorted(columns, (("round", 1), ("stars", -1), ("destruction", -1)))
+
+def normal_ranking_columns(war, clan_tag):
+    columns = _empty(NORMAL_RANKING_SCHEMA)
+
+    if war and war.get("state") != "notInWar":
+        me = _my_side(war, clan_tag)
+        if me is not None:
+            _append_members(columns, me, max_attacks=war.get("attacksPerMember", 2))
+
+    return _sorted(columns, (("stars", -1), ("destruction", -1)))
+
+def to_arrow_ipc(columns, schema) -> bytes:
+    arrow_schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in schema])
+    table = pa.Table.from_pydict(columns, schema=arrow_schema)
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, arrow_schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
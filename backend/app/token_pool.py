@@ -0,0 +1,149 @@
+import itertools
+import threading
+import time
+from collections import deque
+from .config import (
+    COC_API_TOKENS,
+    TOKEN_QUARANTINE_FORBIDDEN,
+    TOKEN_QUARANTINE_THROTTLED,
+    TOKEN_MAX_429,
+    TOKEN_429_WINDOW,
+)
+from . import rate_limiter
+
+# =============================
+# 🔑 Pool de tokens de la API
+# =============================
+# Cada token de Clash of Clans tiene su propio límite (y va ligado a una IP).
+# Con varios tokens se reparte la carga: se elige el menos cargado (peticiones
+# en vuelo y en el último segundo) y, a igualdad, por turnos. Un token que
+# devuelve 403 por IP inválida o 429 repetidos se aparta (cuarentena) un tiempo.
+
+_lock = threading.Lock()
+_turn = itertools.count()
+_tokens = [
+    {
+        "index": i - 1,
+        "label": f"token-{i}",
+        "value": value,
+        "in_flight": 0,
+        "requests": 0,
+        "recent": deque(),       # instantes de las peticiones del último segundo
+        "recent_429": deque(),   # instantes de los últimos 429
+        "throttled": 0,
+        "forbidden": 0,
+        "quarantined_until": 0.0,
+    }
+    for i, value in enumerate(COC_API_TOKENS, start=1)
+]
+_healthy = None
+
+def _prune(token, now):
+    while token["recent"] and now - token["recent"][0] > 1.0:
+        token["recent"].popleft()
+    while token["recent_429"] and now - token["recent_429"][0] > TOKEN_429_WINDOW:
+        token["recent_429"].popleft()
+
+def _update_capacity(now):
+    # 🚦 El ritmo global escala con el nº de tokens sanos
+    global _healthy
+
+    healthy = sum(1 for t in _tokens if t["quarantined_until"] <= now)
+    if healthy != _healthy:
+        _healthy = healthy
+        rate_limiter.set_capacity(max(1, healthy))
+
+def acquire():
+    now = time.monotonic()
+
+    with _lock:
+        _update_capacity(now)
+
+        available = [t for t in _tokens if t["quarantined_until"] <= now]
+        if not available:
+            # Todos en cuarentena: mejor probar el que antes sale que no llamar
+            available = [min(_tokens, key=lambda t: t["quarantined_until"])]
+
+        for token in available:
+            _prune(token, now)
+
+        # Menos cargado primero; a igualdad, por turnos
+        turn = next(_turn)
+        token = min(
+            available,
+            key=lambda t: (
+                t["in_flight"],
+                len(t["recent"]),
+                (t["index"] - turn) % len(_tokens),
+            ),
+        )
+
+        token["in_flight"] += 1
+        token["requests"] += 1
+        token["recent"].append(now)
+        return token
+
+def auth_headers(token) -> dict:
+    return {"Authorization": f"Bearer {token['value']}"}
+
+def response_reason(response):
+    try:
+        return (response.json() or {}).get("reason")
+    except Exception:
+        return None
+
+def is_invalid_ip(response) -> bool:
+    return response.status_code == 403 and response_reason(response) == "accessDenied.invalidIp"
+
+def size() -> int:
+    return len(_tokens)
+
+def release(token, response=None):
+    now = time.monotonic()
+
+    with _lock:
+        token["in_flight"] = max(0, token["in_flight"] - 1)
+
+        if response is None:
+            return
+
+        if is_invalid_ip(response):
+            # 🛑 Token de otra IP: no va a funcionar desde aquí
+            token["forbidden"] += 1
+            token["quarantined_until"] = now + TOKEN_QUARANTINE_FORBIDDEN
+            print(f"⚠️ {token['label']} rechazado por IP inválida: en cuarentena")
+
+        elif response.status_code == 429:
+            token["throttled"] += 1
+            token["recent_429"].append(now)
+            _prune(token, now)
+
+            if len(token["recent_429"]) >= TOKEN_MAX_429:
+                token["quarantined_until"] = now + TOKEN_QUARANTINE_THROTTLED
+                token["recent_429"].clear()
+                print(f"⚠️ {token['label']} con 429 repetidos: en cuarentena")
+
+        _update_capacity(now)
+
+def get_token_pool_stats():
+    now = time.monotonic()
+
+    with _lock:
+        tokens = []
+        for token in _tokens:
+            _prune(token, now)
+            tokens.append({
+                "label": token["label"],
+                "in_flight": token["in_flight"],
+                "requests": token["requests"],
+                "requests_last_second": len(token["recent"]),
+                "throttled": token["throttled"],
+                "forbidden": token["forbidden"],
+                "quarantined_seconds": round(max(0.0, token["quarantined_until"] - now), 1),
+            })
+
+        return {
+            "tokens": len(_tokens),
+            "healthy": sum(1 for t in _tokens if t["quarantined_until"] <= now),
+            "per_token": tokens,
+        }
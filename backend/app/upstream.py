@@ -0,0 +1,111 @@
+import time
+from . import response_cache
+from . import rate_limiter
+from . import conditional
+from . import token_pool
+from . import resilience
+from . import negative_cache
+from .config import RATE_LIMIT_MAX_RETRIES, HTTP_CALL_DEADLINE
+
+# =============================
+# 🧭 Decisiones comunes de los clientes de la API (síncrono y asíncrono)
+# =============================
+# Aquí no se hace I/O: qué hacer con cada respuesta (reintentar, parar, cachear,
+# recordar un 403/404, servir lo último cacheado) es igual con requests que con
+# httpx. Cada cliente solo envía, espera y duerme; las respuestas de los dos
+# tienen status_code, headers, content, json() y raise_for_status().
+
+def sent(url: str, token, start: float, response):
+    """Petición terminada con token: se devuelve al pool y cuenta su latencia."""
+    token_pool.release(token, response)
+    if response.status_code < 500:
+        resilience.record_latency(resilience.endpoint_kind(url), time.monotonic() - start)
+
+
+class Attempts:
+    """
+    Reintentos de una llamada (con todos sus intentos dentro de HTTP_CALL_DEADLINE).
+    Tras cada intento, retry_delay dice cuántos segundos esperar antes del siguiente
+    o None si hay que parar.
+    """
+
+    def __init__(self):
+        self.deadline = time.monotonic() + HTTP_CALL_DEADLINE
+        self.attempt = 0
+        self.throttled = 0
+        self.forbidden = 0
+
+    def retry_delay(self, response=None):
+        """response=None: error de red / timeout. None al parar (devolver la respuesta o relanzar)."""
+        if response is not None and response.status_code == 429:
+            # 🐢 El upstream nos está frenando: pausa + menos ritmo, y reintento
+            rate_limiter.report_throttled(rate_limiter.parse_retry_after(response.headers.get("Retry-After")))
+            self.throttled += 1
+            return None if self.throttled > RATE_LIMIT_MAX_RETRIES else 0.0
+
+        if response is not None and token_pool.is_invalid_ip(response):
+            # 🔑 Token de otra IP (ya en cuarentena): se reintenta con otro token sano
+            self.forbidden += 1
+            return None if self.forbidden >= token_pool.size() else 0.0
+
+        if response is None or response.status_code in resilience.RETRYABLE_STATUS:
+            resilience.record_failure()
+            if not resilience.should_retry(self.attempt, self.deadline):
+                return None
+            self.attempt += 1
+            resilience.count("retries")
+            return resilience.retry_delay(self.attempt)
+
+        resilience.record_success()
+        rate_limiter.report_success()
+        return None
+
+
+def serve_stale(url: str):
+    stale = response_cache.get_stale(url)
+    if stale is not None:
+        resilience.count("stale_served")
+    return stale
+
+def stale_or_circuit_open(url: str):
+    # ⚡ API degradada: lo último cacheado o fallo rápido
+    stale = serve_stale(url)
+    if stale is None:
+        raise resilience.CircuitOpenError(f"API de Clash of Clans no disponible ({url})")
+    return stale
+
+def not_modified(url: str, response):
+    """
+    (data, size) guardados si la respuesta es un 304 y aún los tenemos; None si no.
+    Un 304 sin cuerpo guardado obliga a repetir la petición sin validadores.
+    """
+    if response.status_code != 304:
+        return None
+    return conditional.not_modified(url)
+
+def finish(url: str, response, stored=None):
+    """JSON de la respuesta final: errores, caché negativa, validadores y caché de respuestas."""
+    if stored is not None:
+        # 🏷️ Sin cambios: el cuerpo guardado, sin volver a parsear
+        data, size = stored
+    else:
+        if response.status_code in resilience.RETRYABLE_STATUS:
+            stale = serve_stale(url)
+            if stale is not None:
+                return stale
+
+        if response.status_code in (403, 404):
+            negative_cache.remember(url, response.status_code, token_pool.response_reason(response))
+
+        response.raise_for_status()
+        data = response.json()
+        size = len(response.content)
+        conditional.remember(url, response.headers, data, size)
+
+    response_cache.put(
+        url,
+        data,
+        ttl=response_cache.ttl_for(data, response.headers.get("Cache-Control")),
+        size=size,
+    )
+    return data
@@ -0,0 +1,125 @@
+# =============================
+# 🔀 Diferencias entre dos refrescos de un resumen (CWL o guerra normal)
+# =============================
+# Solo lo que cambia de verdad en cada guerra: estado, totales (estrellas,
+# destrucción, ataques), ataques nuevos o modificados del ranking y win_state.
+# time_left no cuenta: cambia cada minuto aunque no pase nada.
+
+def _attack_key(row):
+    return (row.get("Pos"), row.get("Jugador"))
+
+def diff_war(old, new):
+    """Cambios de una guerra (payload de build_war_payload) entre dos refrescos; {} si nada."""
+    changes = {}
+
+    if old.get("state") != new.get("state"):
+        changes["state"] = new.get("state")
+
+    old_summary = old.get("summary") or {}
+    totals = {k: v for k, v in (new.get("summary") or {}).items() if old_summary.get(k) != v}
+    if totals:
+        changes["totals"] = totals
+
+    old_rows = {_attack_key(row): row for row in old.get("ranking") or []}
+    attacks = [row for row in new.get("ranking") or [] if old_rows.get(_attack_key(row)) != row]
+    if attacks:
+        changes["attacks"] = attacks
+
+    # 🎲 La probabilidad en vivo es Monte Carlo: sin otros cambios, su ruido no se envía
+    old_win = old.get("win_state") or {}
+    new_win = new.get("win_state") or {}
+    if new_win != old_win and (changes or new_win.get("status") != old_win.get("status")):
+        changes["win_state"] = new_win
+
+    return changes
+
+def diff_summary(old, new):
+    """Lista de cambios por ronda entre dos resúmenes CWL ([] si son equivalentes)."""
+    old_wars = {w.get("round"): w for w in (old or {}).get("wars") or []}
+    changes = []
+
+    for war in new.get("wars") or []:
+        previous = old_wars.get(war.get("round"))
+
+        if previous is None:
+            # Ronda nueva (p. ej. la siguiente entra en preparación)
+            changes.append({"round": war.get("round"), "war": war})
+            continue
+
+        war_changes = diff_war(previous, war)
+        if war_changes:
+            changes.append({"round": war.get("round"), **war_changes})
+
+    return changes
+
+# Claves que se recalculan en cada petición y no son "cambios"
+_VOLATILE = ("generated_at", "wars")
+
+def diff_cwl_summary(old, new):
+    """
+    Cambios de un resumen CWL completo: {"wars": [...], "sections": {...}}.
+    Las demás secciones (strength_ranking, group_raw...) se mandan enteras si cambian.
+    None si no se puede expresar como cambios (otro clan, CWL que empieza o acaba).
+    """
+    if old.get("clan_tag") != new.get("clan_tag") or old.get("no_cwl") != new.get("no_cwl"):
+        return None
+
+    changes = {}
+
+    wars = diff_summary(old, new)
+    if wars:
+        changes["wars"] = wars
+
+    sections = {
+        k: v for k, v in new.items()
+        if k not in _VOLATILE and old.get(k) != v
+    }
+    if sections:
+        changes["sections"] = sections
+
+    return changes
+
+def _diff_raw_side(old, new):
+    old_members = {m.get("tag"): m for m in old.get("members") or []}
+    changes = {
+        k: v for k, v in new.items()
+        if k != "members" and old.get(k) != v
+    }
+
+    members = [m for m in new.get("members") or [] if old_members.get(m.get("tag")) != m]
+    if members:
+        changes["members"] = members
+
+    return changes
+
+def _diff_raw_war(old, new):
+    # full_war_data: campos sueltos que cambien y, por bando, los miembros con ataques nuevos
+    changes = {
+        k: v for k, v in new.items()
+        if k not in ("clan", "opponent") and old.get(k) != v
+    }
+
+    for side in ("clan", "opponent"):
+        side_changes = _diff_raw_side(old.get(side) or {}, new.get(side) or {})
+        if side_changes:
+            changes[side] = side_changes
+
+    return changes
+
+def diff_normal_war(old, new):
+    """Cambios de un resumen de guerra normal; None si es otra guerra (o ya no hay)."""
+    # Sin guerra antes ni ahora: no ha cambiado nada
+    if old.get("state") == "notInWar" and new.get("state") == "notInWar":
+        return {}
+
+    if "notInWar" in (old.get("state"), new.get("state")) or old.get("opp") != new.get("opp"):
+        return None
+
+    changes = diff_war(old, new)
+
+    if new.get("full_war_data") is not None:
+        raw = _diff_raw_war(old.get("full_war_data") or {}, new["full_war_data"])
+        if raw:
+            changes["full_war_data"] = raw
+
+    return changes
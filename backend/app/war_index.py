@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from .config import WAR_INDEX_MAX_ENTRIES
+from . import war_store
+
+# =============================
+# 🗂️ Índice warTag → (ronda, clan, rival, estado)
+# =============================
+# Se rellena cada vez que se descarga una guerra de CWL, sea del clan que sea.
+# Así, cuando se pide otro clan del mismo grupo, ya sabemos qué warTag es el suyo
+# en cada ronda y no hace falta descargar las otras tres guerras.
+_index = OrderedDict()
+_lock = threading.Lock()
+_loaded = False
+_stats = {
+    "lookups_hit": 0,
+    "lookups_miss": 0,
+}
+
+def _ensure_loaded():
+    # 💾 Al arrancar, el índice se recupera de las guerras finalizadas guardadas en disco
+    global _loaded
+
+    if _loaded:
+        return
+
+    entries = war_store.iter_index_entries(WAR_INDEX_MAX_ENTRIES)
+
+    with _lock:
+        if not _loaded:
+            for war_tag, entry in entries:
+                _index.setdefault(war_tag, entry)
+            _loaded = True
+
+def index_war(war_tag: str, round_idx: int, war: dict):
+    clan_tag = (war.get("clan") or {}).get("tag")
+    opp_tag = (war.get("opponent") or {}).get("tag")
+
+    # 🛑 Guerra sin tags (no debería pasar en CWL, pero no indexamos basura)
+    if not clan_tag or not opp_tag:
+        return
+
+    entry = {
+        "round": round_idx,
+        "clan_tag": clan_tag,
+        "opponent_tag": opp_tag,
+        "state": war.get("state"),
+    }
+
+    with _lock:
+        _index[war_tag] = entry
+        _index.move_to_end(war_tag)
+
+        while len(_index) > WAR_INDEX_MAX_ENTRIES:
+            _index.popitem(last=False)
+
+def lookup(war_tag: str):
+    _ensure_loaded()
+
+    with _lock:
+        entry = _index.get(war_tag)
+
+        if entry is None:
+            _stats["lookups_miss"] += 1
+            return None
+
+        _stats["lookups_hit"] += 1
+        return dict(entry)
+
+def get_state(war_tag: str):
+    """Último estado conocido de un warTag (sin contar como consulta en las métricas)."""
+    _ensure_loaded()
+
+    with _lock:
+        entry = _index.get(war_tag)
+        return entry["state"] if entry else None
+
+def involves(entry, clan_tag: str) -> bool:
+    return bool(entry) and clan_tag in (entry["clan_tag"], entry["opponent_tag"])
+
+def plan_round(war_tags, clan_tag: str):
+    """
+    Decide qué warTags de una ronda hay que descargar para encontrar la guerra de clan_tag.
+    - Si el índice ya sabe cuál es la nuestra → solo esa.
+    - Si no, las que el índice no conoce (las conocidas son de otros clanes), en orden.
+    """
+    unknown = []
+
+    for war_tag in war_tags:
+        entry = lookup(war_tag)
+
+        if entry is None:
+            unknown.append(war_tag)
+        elif involves(entry, clan_tag):
+            return [war_tag]
+
+    return unknown
+
+def get_index_stats():
+    with _lock:
+        return {
+            "entries": len(_index),
+            **_stats,
+        }
@@ -0,0 +1,177 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timezone
+from .config import WAR_STORE_ENABLED, WAR_STORE_PATH
+
+# =============================
+# 💾 Almacén en disco de guerras CWL finalizadas
+# =============================
+# Una guerra con state == "warEnded" ya no cambia nunca: se guarda el JSON crudo
+# (comprimido) por warTag y, al lado, el payload ya calculado para cada clan
+# (summary, ranking, win_state). El resto de la semana de CWL no se vuelve a
+# descargar ni a procesar.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS wars (
+    war_tag TEXT PRIMARY KEY,
+    round INTEGER,
+    clan_tag TEXT NOT NULL,
+    opponent_tag TEXT NOT NULL,
+    raw BLOB NOT NULL,
+    stored_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS war_payloads (
+    war_tag TEXT NOT NULL,
+    clan_tag TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (war_tag, clan_tag)
+);
+"""
+
+_init_lock = threading.Lock()
+_initialized = False
+
+_stats_lock = threading.Lock()
+_stats = {
+    "war_hits": 0,
+    "war_misses": 0,
+    "wars_saved": 0,
+    "payload_hits": 0,
+    "payload_misses": 0,
+}
+
+def _count(key: str):
+    with _stats_lock:
+        _stats[key] += 1
+
+def _pack(obj) -> bytes:
+    return zlib.compress(json.dumps(obj, separators=(",", ":")).encode("utf-8"))
+
+def _unpack(blob: bytes):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                os.makedirs(os.path.dirname(WAR_STORE_PATH) or ".", exist_ok=True)
+                conn = sqlite3.connect(WAR_STORE_PATH, timeout=10)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                conn.commit()
+                conn.close()
+                _initialized = True
+
+    # Una conexión por operación: sqlite3 no comparte conexiones entre hilos
+    return sqlite3.connect(WAR_STORE_PATH, timeout=10)
+
+
+def get_war(war_tag: str):
+    if not WAR_STORE_ENABLED:
+        return None
+
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT raw FROM wars WHERE war_tag = ?", (war_tag,)).fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        _count("war_misses")
+        return None
+
+    _count("war_hits")
+    return _unpack(row[0])
+
+def save_war(war_tag: str, round_idx: int, war: dict):
+    # 🛑 Solo lo inmutable
+    if not WAR_STORE_ENABLED or war.get("state") != "warEnded":
+        return
+
+    clan_tag = (war.get("clan") or {}).get("tag")
+    opp_tag = (war.get("opponent") or {}).get("tag")
+    if not clan_tag or not opp_tag:
+        return
+
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO wars (war_tag, round, clan_tag, opponent_tag, raw, stored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (war_tag, round_idx, clan_tag, opp_tag, _pack(war), datetime.now(timezone.utc).isoformat()),
+            )
+    finally:
+        conn.close()
+
+    _count("wars_saved")
+
+def get_payload(war_tag: str, clan_tag: str):
+    if not WAR_STORE_ENABLED:
+        return None
+
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT payload FROM war_payloads WHERE war_tag = ? AND clan_tag = ?",
+            (war_tag, clan_tag),
+        ).fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        _count("payload_misses")
+        return None
+
+    _count("payload_hits")
+    return _unpack(row[0])
+
+def save_payload(war_tag: str, clan_tag: str, payload: dict):
+    if not WAR_STORE_ENABLED:
+        return
+
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO war_payloads (war_tag, clan_tag, payload) VALUES (?, ?, ?)",
+                (war_tag, clan_tag, _pack(payload)),
+            )
+    finally:
+        conn.close()
+
+def iter_index_entries(limit: int):
+    """Entradas (warTag, ronda, clan, rival) más recientes, para precargar el índice en memoria."""
+    if not WAR_STORE_ENABLED:
+        return []
+
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT war_tag, round, clan_tag, opponent_tag FROM wars ORDER BY stored_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    return [
+        (war_tag, {
+            "round": round_idx,
+            "clan_tag": clan_tag,
+            "opponent_tag": opp_tag,
+            "state": "warEnded",
+        })
+        for war_tag, round_idx, clan_tag, opp_tag in reversed(rows)
+    ]
+
+def get_store_stats():
+    with _stats_lock:
+        return {
+            "enabled": WAR_STORE_ENABLED,
+            **_stats,
+        }
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# config.py exige un token al importarse; los tests no llaman a la API
+os.environ.setdefault("COC_API_TOKEN", "test")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
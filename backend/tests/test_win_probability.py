@@ -0,0 +1,71 @@
+import pytest
+
+from app.cwl_logic import realtime_war_state
+
+# =============================
+# 🎯 Exacto vs Monte Carlo
+# =============================
+@pytest.mark.parametrize("state", [
+    # me_stars, me_done, opp_stars, opp_done (15v15, 1 ataque por miembro)
+    (20, 8, 22, 9),
+    (10, 3, 10, 3),
+    (30, 12, 25, 10),
+])
+def test_exact_matches_montecarlo(state):
+    me_stars, me_done, opp_stars, opp_done = state
+    args = (me_stars, me_done, 15, opp_stars, opp_done, 15, 15, 1)
+
+    exact = realtime_war_state(*args, method="exact")
+    simulated = realtime_war_state(*args, method="montecarlo", simulations=200000)
+
+    assert exact["status"] == simulated["status"] == "open_war"
+    for key in ("win_probability", "lose_probability", "draw_probability"):
+        assert simulated[key] == pytest.approx(exact[key], abs=1.0)
+
+def test_custom_distribution_matches_montecarlo():
+    dist_me = {3: 0.6, 2: 0.3, 1: 0.1}
+    dist_opp = {3: 0.2, 2: 0.4, 1: 0.2, 0: 0.2}
+    args = (12, 5, 15, 15, 7, 15, 15, 1, dist_me, dist_opp)
+
+    exact = realtime_war_state(*args, method="exact")
+    simulated = realtime_war_state(*args, simulations=200000, method="montecarlo")
+
+    for key in ("win_probability", "lose_probability", "draw_probability"):
+        assert simulated[key] == pytest.approx(exact[key], abs=1.0)
+
+def test_probabilities_add_up():
+    result = realtime_war_state(20, 8, 15, 22, 9, 15, 15, 1, method="exact")
+    total = result["win_probability"] + result["lose_probability"] + result["draw_probability"]
+    assert total == pytest.approx(100.0, abs=0.2)
+
+# =============================
+# 🟢 Cierres matemáticos
+# =============================
+@pytest.mark.parametrize("method", ["exact", "montecarlo"])
+@pytest.mark.parametrize("me_stars, opp_stars, status, win, lose, draw", [
+    (30, 25, "finished_win", 100.0, 0.0, 0.0),
+    (25, 30, "finished_loss", 0.0, 100.0, 0.0),
+    (28, 28, "finished_draw", 0.0, 0.0, 100.0),
+])
+def test_finished(method, me_stars, opp_stars, status, win, lose, draw):
+    result = realtime_war_state(me_stars, 15, 15, opp_stars, 15, 15, 15, 1, method=method)
+    assert result == {
+        "status": status, "win_probability": win, "lose_probability": lose, "draw_probability": draw,
+    }
+
+@pytest.mark.parametrize("method", ["exact", "montecarlo"])
+def test_secured_win(method):
+    # Al rival le quedan 2 ataques (6 estrellas como mucho) y va 7 por debajo
+    result = realtime_war_state(40, 10, 15, 33, 13, 15, 15, 1, method=method)
+    assert result["status"] == "secured_win"
+    assert result["win_probability"] == 100.0
+
+@pytest.mark.parametrize("method", ["exact", "montecarlo"])
+def test_secured_loss(method):
+    result = realtime_war_state(33, 13, 15, 40, 10, 15, 15, 1, method=method)
+    assert result["status"] == "secured_loss"
+    assert result["lose_probability"] == 100.0
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        realtime_war_state(10, 3, 15, 10, 3, 15, 15, 1, method="bayes")
@@ -1,12 +1,11 @@
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
 import requests
 import os
 import re
 import copy
-import random
 from datetime import datetime
-from collections import defaultdict
 from donations import render_donations_tab
 
 
@@ -16,44 +15,60 @@ BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000") # local
 import streamlit as st
 
 @st.cache_data(ttl=60, show_spinner=False)
-def get_full_summary_api(clan_tag):
+def get_full_summaries_api(clan_tags):
+    # 📦 Todos los clanes seleccionados en una sola petición
+    # Devuelve {tag: resumen}; los fallos de cada clan vienen en línea como {"error", "status"}
     try:
         r = requests.get(
-            f"{BACKEND_URL}/cwl/full-summary",
-            params={
-                "clan_tag": clan_tag
-            },
+            f"{BACKEND_URL}/cwl/full-summaries",
+            params=[("clan_tag", tag) for tag in clan_tags] + [
+                # ✂️ Sin group_raw (no se usa) ni ranking (llega tipado en ranking_table)
+                ("include", "wars,ranking_table,strength_ranking,position_advantage"),
+            ],
             timeout=60,
         )
+        r.raise_for_status()
+        return r.json().get("summaries", {})
 
-        if r.status_code == 403:
-            st.warning(f"🔒 El clan {clan_tag} es privado o no tienes acceso.")
-            return None
+    except requests.exceptions.Timeout:
+        st.error("⏱️ Timeout al consultar los clanes.")
+        return {}
 
-        if r.status_code == 404:
-            st.warning(f"❌ Clan {clan_tag} no encontrado.")
-            return None
+    except requests.exceptions.RequestException as e:
+        st.error("⚠️ Error de red al consultar los clanes.")
+        st.caption(str(e))
+        return {}
 
-        if r.status_code >= 500:
-            # Puede ser NO CWL, no necesariamente error real
-            try:
-                data = r.json()
-                return data
-            except Exception:
-                st.error(f"🚨 Error del servidor para clan {clan_tag}. es posible que el clan no este publico")
-            return None
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_ranking_table_api(path, clan_tag):
+    # 📊 Ranking como tabla tipada (Arrow IPC → DataFrame sin reparsear strings)
+    try:
+        r = requests.get(
+            f"{BACKEND_URL}{path}",
+            params={"clan_tag": clan_tag, "format": "arrow"},
+            timeout=60,
+        )
+
+        if r.status_code == 406:
+            # Backend sin pyarrow: mismas columnas en JSON
+            r = requests.get(
+                f"{BACKEND_URL}{path}",
+                params={"clan_tag": clan_tag, "format": "json"},
+                timeout=60,
+            )
+            r.raise_for_status()
+            return pd.DataFrame(r.json()["columns"])
 
         r.raise_for_status()
-        return r.json()
+        return pa.ipc.open_stream(r.content).read_all().to_pandas(split_blocks=True)
 
-    except requests.exceptions.Timeout:
-        st.error(f"⏱️ Timeout al consultar clan {clan_tag}.")
+    except requests.exceptions.RequestException:
         return None
 
-    except requests.exceptions.RequestException as e:
-        st.error(f"⚠️ Error de red para clan {clan_tag}.")
-        st.caption(str(e))
-        return None
+
+def render_stars(n):
+    return "⭐" * n + "✩" * (3 - n)
 
 
 def get_war_summary_api(clan_tag):
@@ -93,11 +108,67 @@ def get_clan_info_api(clan_tag):
         st.caption(str(e))
         return None
 
-@st.cache_data(ttl=30)
+def _patch_members(members, changed):
+    by_tag = {m.get("tag"): m for m in changed}
+    known = {m.get("tag") for m in members}
+    return [by_tag.get(m.get("tag"), m) for m in members] + [m for m in changed if m.get("tag") not in known]
+
+def apply_normal_war_delta(war, delta):
+    # 🧾 Aplica sobre la última copia los cambios de /war/normal-summary?since=
+    war = copy.deepcopy(war)
+    war["version"] = delta["version"]
+    war["time_left"] = delta.get("time_left")
+
+    if delta.get("not_modified"):
+        return war
+
+    changes = delta["changes"]
+    if "state" in changes:
+        war["state"] = changes["state"]
+    if "totals" in changes and war.get("summary") is not None:
+        war["summary"].update(changes["totals"])
+
+    raw = changes.get("full_war_data")
+    if raw and war.get("full_war_data") is not None:
+        full = war["full_war_data"]
+        for key, value in raw.items():
+            if key in ("clan", "opponent"):
+                side = full.setdefault(key, {})
+                side.update({k: v for k, v in value.items() if k != "members"})
+                if "members" in value:
+                    side["members"] = _patch_members(side.get("members", []), value["members"])
+            else:
+                full[key] = value
+
+    return war
+
 def get_normal_war_api(clan_tag):
+    # Sin caché de Streamlit: con ?since= cada refresco solo trae lo que ha cambiado
+    snapshots = st.session_state.setdefault("normal_war_snapshots", {})
+    previous = snapshots.get(clan_tag)
+
+    params = {"clan_tag": clan_tag, "include": "summary,full_war_data"}  # El ranking llega tipado por /war/normal-ranking-table
+    if previous is not None:
+        params["since"] = previous["version"]
+
+    try:
+        r = requests.get(f"{BACKEND_URL}/war/normal-summary", params=params, timeout=30)
+        r.raise_for_status()
+        data = r.json()
+    except:
+        return None
+
+    if previous is not None and (data.get("not_modified") or data.get("delta")):
+        data = apply_normal_war_delta(previous, data)
+
+    snapshots[clan_tag] = data
+    return data
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_normal_probabilities_api(clan_tag):
     try:
         r = requests.get(
-            f"{BACKEND_URL}/war/normal-summary",
+            f"{BACKEND_URL}/war/normal-probabilities",
             params={"clan_tag": clan_tag},
             timeout=30
         )
@@ -203,15 +274,22 @@ if not selected_clans:
 
 
 
-def render_cwl_tab(clan):
+def render_cwl_tab(clan, data):
 
     #for clan in selected_clans:
     clan_tag = clan['tag'] #logica para seleccion de clanes desde el dropdownlist
     #clan_tag = st.session_state["selected_clan"] #logica para seleccion de clanes desde botones
     st.header(f"🏰 Clan {clan_tag}")
 
-#with st.spinner("🔄 Actualizando datos del clan..."):
-    data = get_full_summary_api(clan_tag)
+    if data and data.get("error"):
+        status = data.get("status")
+        if status == 403:
+            st.warning(f"🔒 El clan {clan_tag} es privado o no tienes acceso.")
+        elif status == 404:
+            st.warning(f"❌ Clan {clan_tag} no encontrado o sin CWL.")
+        else:
+            st.error(f"🚨 Error del servidor para clan {clan_tag}: {data['error']}")
+        data = None
 
     if not data:
         st.info(f"⏭️ Saltando clan {clan['name']}")
@@ -236,38 +314,26 @@ def render_cwl_tab(clan):
         st.warning("No hay datos de guerras CWL para este clan.")
         return
 
-    player_history = defaultdict(lambda: {
-        "attacks": 0,
-        "Estrellas": 0,
-        "% Destrucción": 0.0,
-        "fails": 0,
-        "no_attack": 0,
-        "rounds": 0,
-    })
-
-    for war_hist in wars:
-        for p in war_hist["ranking"]:
-            name = p["Jugador"]
-
-            player_history[name]["rounds"] += 1
-
-            if p["Atacó"]:
-                player_history[name]["attacks"] += 1
-                stars = int(p["_stars_sort"])  # SIEMPRE int real
-                destr_raw = p["% Destrucción"]
-                if isinstance(destr_raw, str):
-                    destr = float(destr_raw.replace("%", "").strip())
-                else:
-                    destr = float(destr_raw)
+    # 📊 Ranking tipado: llega en el mismo lote (sección ranking_table)
+    ranking_table = data.get("ranking_table")
+    if ranking_table is None:
+        st.warning("No se pudo cargar el ranking de jugadores.")
+        ranking_table = {name: [] for name in ("round", "name", "map_position", "attacked", "stars", "destruction")}
+    ranking_df = pd.DataFrame(ranking_table).astype({"attacked": bool})
 
-                player_history[name]["Estrellas"] += stars
-                player_history[name]["% Destrucción"] += destr
+    player_history = {}
 
+    for name, rows in ranking_df.groupby("name", sort=False):
+        attacked = rows[rows["attacked"]]
 
-                if stars == 0:
-                    player_history[name]["fails"] += 1
-            else:
-                player_history[name]["no_attack"] += 1
+        player_history[name] = {
+            "attacks": len(attacked),
+            "Estrellas": int(attacked["stars"].sum()),
+            "% Destrucción": float(attacked["destruction"].sum()),
+            "fails": int((attacked["stars"] == 0).sum()),
+            "no_attack": int((~rows["attacked"].astype(bool)).sum()),
+            "rounds": len(rows),
+        }
 
 
 
@@ -512,25 +578,29 @@ def render_cwl_tab(clan):
                 f"{summary['me_destr'] - summary['opp_destr']:+.2f}%"
             )
 
-        # 📊 Ranking
-        ranking = war["ranking"]
-        df = pd.DataFrame(ranking)
+        # 📊 Ranking (formato visual solo aquí)
+        war_rows = ranking_df[ranking_df["round"] == round_idx].sort_values(
+            by=["stars", "destruction"],
+            ascending=[False, False]
+        )
+
+        df = pd.DataFrame({
+            "Jugador": war_rows["name"],
+            "Pos": war_rows["map_position"],
+            "Atacó": war_rows["attacked"].astype(bool),
+            "Estado": war_rows["attacked"].map(lambda a: "⚔️" if a else "❌"),
+            "Estrellas": war_rows["stars"].map(lambda n: render_stars(int(n))),
+            "% Destrucción": war_rows["destruction"].map(lambda d: f"{d:.2f}%"),
+        })
 
         def highlight_no_attack(row):
             styles = [""] * len(row)
 
-            if row["Atacó"] is False:
+            if not row["Atacó"]:
                 # Rojo suave, NO tapa el texto
                 styles = ["background-color: rgba(255, 0, 0, 0.15)"] * len(row)
 
             return styles
-        
-        df = df.sort_values(
-            by=["_stars_sort", "_destr_sort"],
-            ascending=[False, False]
-        )
-
-        df = df.drop(columns=["_stars_sort", "_destr_sort"])
 
         styled_df = (
             df.style
@@ -664,109 +734,6 @@ def render_cwl_tab(clan):
                 st.warning(f"🟡 Guerra equilibrada vs {row['opponent']}")   
 
 
-# ==========================
-#GUERRA NORMAL
-# ==========================
-
-# REEMPLAZAR COMPLETAMENTE la función simulate_normal_war_pro POR ESTAS NUEVAS FUNCIONES
-# (colócalas justo antes de def render_normal_war_tab(clan): )
-
-def get_star_probs(delta):
-    """Probabilidades realistas [P0, P1, P2, P3] basadas en stats comunitarias (tunables)"""
-    if delta >= 2:
-        return [0.00, 0.00, 0.00, 1.00]
-    elif delta == 1:
-        return [0.00, 0.05, 0.10, 0.85]   # menos 3★ que antes
-    elif delta == 0:
-        return [0.10, 0.20, 0.30, 0.40]   # solo 40% 3★ en mirror (realista en guerras cerradas)
-    elif delta == -1:
-        return [0.15, 0.30, 0.40, 0.15]
-    elif delta == -2:
-        return [0.30, 0.40, 0.25, 0.05]
-    else:
-        return [0.60, 0.30, 0.09, 0.01]
-
-def expected_additional(att_th, base_th, rem_stars):
-    """Expected stars adicionales (capped por rem)"""
-    delta = att_th - base_th
-    probs = get_star_probs(delta)
-    e = sum(min(s, rem_stars) * p for s, p in enumerate(probs))
-    return e
-
-def sample_stars(att_th, base_th):
-    """Sample real 0-3 estrellas"""
-    delta = att_th - base_th
-    probs = get_star_probs(delta)
-    r = random.random()
-    cum = 0.0
-    for s in range(4):
-        cum += probs[s]
-        if r < cum:
-            return s
-    return 0
-
-def simulate_additional_stars(att_ths_list, bases_list):
-    """Simula estrellas adicionales: attackers fuertes atacan bases óptimas primero"""
-    bases = copy.deepcopy(bases_list)
-    att_ths = sorted(att_ths_list, reverse=True)  # TH altos primero
-    total_add = 0
-    for att_th in att_ths:
-        avail_bases = [i for i, b in enumerate(bases) if b['rem_stars'] > 0]
-        if not avail_bases:
-            break
-        # Elige MEJOR base (max expected)
-        best_idx = max(
-            avail_bases,
-            key=lambda i: expected_additional(att_th, bases[i]['th'], bases[i]['rem_stars'])
-        )
-        exp_val = expected_additional(att_th, bases[best_idx]['th'], bases[best_idx]['rem_stars'])
-        if exp_val <= 0:
-            continue
-        # Sample y aplica
-        got_stars = sample_stars(att_th, bases[best_idx]['th'])
-        add = min(got_stars, bases[best_idx]['rem_stars'])
-        bases[best_idx]['rem_stars'] -= add
-        total_add += add
-    return total_add
-
-def estimate_normal_war_probs(opp_bases, me_bases, my_att_ths, opp_att_ths,my_stars_current,opp_stars_current, num_sims=8000):
-    """Monte Carlo principal: % win/draw/lose"""
-    my_current_total = sum(b['stars'] for b in opp_bases)
-    opp_current_total = sum(b['stars'] for b in me_bases)
-    
-    # Prepara rem_stars para cada sim
-    opp_bases_rem = [{'th': b['th'], 'rem_stars': 3 - b['stars']} for b in opp_bases]
-    me_bases_rem = [{'th': b['th'], 'rem_stars': 3 - b['stars']} for b in me_bases]
-    
-    wins = ties = losses = 0
-    for _ in range(num_sims):
-        my_add = simulate_additional_stars(my_att_ths[:], opp_bases_rem[:])
-        opp_add = simulate_additional_stars(opp_att_ths[:], me_bases_rem[:])
-        
-        # Pequeño ruido para evitar empates forzados (simula fallos impredecibles)
-        my_add += random.uniform(-0.5, 0.5)
-        opp_add += random.uniform(-0.5, 0.5)
-        
-        final_my = my_stars_current + my_add
-        final_opp = opp_stars_current + opp_add
-
-        
-        if final_my > final_opp:
-            wins += 1
-        elif final_my < final_opp:
-            losses += 1
-        else:
-            ties += 1
-
-    
-    total = num_sims
-    return {
-        "win": round(wins / total * 100, 1),
-        "draw": round(ties / total * 100, 1),
-        "lose": round(losses / total * 100, 1)
-    }
-
-
 # ==========================
 # Guerra Normal render
 # ==========================
@@ -1125,28 +1092,21 @@ def render_normal_war_tab(clan):
     # =============================
     # SIMULACIÓN SI LA GUERRA SIGUE ABIERTA
     # =============================
-    # if not display_result:
-    #     if war_state == "preparation":
-    #         st.info("🛠️ Guerra en preparación — simulación no disponible aún")
-    #     elif war_state == "inWar":           
-    #         with st.spinner("🔄 Simulando miles de escenarios posibles..."):
-    #             result = estimate_normal_war_probs(
-    #                 opp_bases=opp_bases,       # bases del rival (donde atacamos nosotros)
-    #                 me_bases=me_bases,         # nuestras bases (donde ataca el rival)
-    #                 my_att_ths=me_attackers,   # THs de nuestros ataques restantes
-    #                 opp_att_ths=opp_attackers, # THs de los ataques restantes del rival
-    #                 my_stars_current=my_stars_current,     
-    #                 opp_stars_current=opp_stars_current,   
-    #                 num_sims=8000             # puedes subir a 12000 si quieres más precisión                    
-    #             )
-            
-    #         st.warning(
-    #             f"🟡 Guerra en curso (Simulación - no determina el resultado final de la guerra)\n"
-    #             f"🎯 Victoria: **{result['win']}%** | "
-    #             f"🤝 Empate: **{result['draw']}%** | "
-    #             f"❌ Derrota: **{result['lose']}%**"
-    #         )           
-    
+    if not display_result:
+        if war_state == "preparation":
+            st.info("🛠️ Guerra en preparación — simulación no disponible aún")
+        elif war_state == "inWar":
+            # 🎲 Simulación con targeting en el backend (/war/normal-probabilities)
+            result = get_normal_probabilities_api(clan_tag)
+
+            if result and result.get("status") == "open_war":
+                st.warning(
+                    f"🟡 Guerra en curso (Simulación - no determina el resultado final de la guerra)\n"
+                    f"🎯 Victoria: **{result['win_probability']}%** | "
+                    f"🤝 Empate: **{result['draw_probability']}%** | "
+                    f"❌ Derrota: **{result['lose_probability']}%**"
+                )
+
 
 
     # ==========================
@@ -1179,34 +1139,41 @@ def render_normal_war_tab(clan):
     # ==========================
     # 📊 RANKING JUGADORES
     # ==========================
-    ranking = war.get("ranking", [])
+    ranking_df = get_ranking_table_api("/war/normal-ranking-table", clan_tag)
 
-    if not ranking:
+    if ranking_df is None or ranking_df.empty:
         st.warning("No hay datos de ranking disponibles.")
         return
-    
-
-    df = pd.DataFrame(ranking)
 
     # Ordenar por estrellas totales y destrucción
-    if "_stars_sort" in df.columns and "_destr_sort" in df.columns:
-        df = df.sort_values(
-            by=["_stars_sort", "_destr_sort"],
-            ascending=[False, False]
-        )
-        df = df.drop(columns=["_stars_sort", "_destr_sort"])
+    ranking_df = ranking_df.sort_values(
+        by=["stars", "destruction"],
+        ascending=[False, False]
+    )
+    max_attacks = full_war.get("attacksPerMember", 2)
+
+    # Formato visual solo aquí
+    df = pd.DataFrame({
+        "Jugador": ranking_df["name"],
+        "Pos": ranking_df["map_position"],
+        "Ataques": ranking_df["attacks"].map(lambda n: f"{n}/{max_attacks}"),
+        "Atacó": ranking_df["attacked"].astype(bool),
+        "Estado": ranking_df["attacked"].map(lambda a: "⚔️" if a else "❌"),
+        "Estrellas": ranking_df["stars"],
+        "% Destrucción": ranking_df["destruction"].map(lambda d: f"{d:.2f}%"),
+    })
+    attacks_done = dict(zip(df.index, ranking_df["attacks"]))
 
-    # Resaltar jugadores que no usaron los 2 ataques    
+    # Resaltar jugadores que no usaron todos sus ataques
     war_state = war.get("state")
 
     def highlight_incomplete(row):
         # 🚫 No resaltar si la guerra no está activa
         if war_state == "preparation":
             return [""] * len(row)
-        
-        if "Ataques" in row:
-            if row["Ataques"].startswith("0/") or row["Ataques"].startswith("1/"):
-                return ["background-color: rgba(255, 0, 0, 0.15)"] * len(row)
+
+        if attacks_done[row.name] < max_attacks:
+            return ["background-color: rgba(255, 0, 0, 0.15)"] * len(row)
         return [""] * len(row)
 
     styled_df = df.style.apply(highlight_incomplete, axis=1)
@@ -1273,11 +1240,15 @@ def render_normal_war_tab(clan):
 # Crear pestañas para cada clan
 tab_labels = [clan["name"] for clan in selected_clans]
 tabs = st.tabs(tab_labels)
+
+if dashboard_mode == "CWL":
+    cwl_summaries = get_full_summaries_api(tuple(clan["tag"] for clan in selected_clans))
+
 #for clan_tag in CLAN_TAGS:
 for i, clan in enumerate(selected_clans):
     with tabs[i]:
         if dashboard_mode  == "CWL":
-            render_cwl_tab(clan)
+            render_cwl_tab(clan, cwl_summaries.get(clan["tag"]))
         elif dashboard_mode == "Guerra Normal":
             render_normal_war_tab(clan)
         elif dashboard_mode == "Donaciones":